@@ -0,0 +1,86 @@
+"""Time combining the site forecasts for 1, 5 and 20 sites.
+
+Every site has 730 days of history and 7 days of forecast, in Sydney time
+with two dampened hours and a hard limit. The per-row loop buildforcastdata
+used before is timed against aggregate_sites with NumPy and with the plain
+array fallback, and all three must give the same series and tallies.
+
+    python benchmarks/bench_aggregate.py
+"""
+import random
+import time
+from datetime import datetime as dt
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from common import load, make_series
+
+aggregate = load("aggregate")
+forecasts = load("forecasts")
+FIELDS = forecasts.FIELDS
+
+def row_loop(sites, tz, damp, hard_limit, field):
+    """The per-row loop of buildforcastdata before the aggregate module"""
+    today = dt.now(tz).date()
+    yesterday = today + timedelta(days=-730)
+    lastday = today + timedelta(days=7)
+    _forecasts = {}
+    tallies = {}
+    for s, series in sites.items():
+        tally = 0
+        for x in series:
+            z = x["period_start"]
+            zz = z.astimezone(tz)
+            if yesterday < zz.date() < lastday:
+                h = f"{zz.hour}"
+                if zz.date() == today:
+                    tally += min(x[field] * 0.5 * damp[h], hard_limit)
+                itm = _forecasts.get(z)
+                if itm:
+                    for f in FIELDS:
+                        itm[f] = min(round(itm[f] + (x[f] * damp[h]), 4), hard_limit)
+                else:
+                    _forecasts[z] = {"period_start": z, **{f: min(round(x[f] * damp[h], 4), hard_limit) for f in FIELDS}}
+        tallies[s] = round(tally, 4)
+    return forecasts.ForecastSeries.from_rows(_forecasts.values()), tallies
+
+def arrays(sites, tz, damp, hard_limit, field):
+    today = dt.now(tz).date()
+    midnight = forecasts.local_midnight
+    combined = aggregate.aggregate_sites(
+        sites, midnight(today + timedelta(days=-729), tz), midnight(today + timedelta(days=7), tz), tz, damp, hard_limit
+    )
+    tallies = aggregate.tally_sites(
+        sites, (midnight(today, tz), midnight(today + timedelta(days=1), tz)), tz, damp, hard_limit, field
+    )
+    return combined, tallies
+
+def same(a, b):
+    return a[0].period == b[0].period and all(a[0].columns[f] == b[0].columns[f] for f in FIELDS) and a[1] == b[1]
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    ret = fn(*args)
+    return ret, (time.perf_counter() - t) * 1000
+
+def main():
+    rnd = random.Random(3)
+    tz = ZoneInfo("Australia/Sydney")
+    damp = {f"{h}": 0.8 if h in (9, 10) else 1.0 for h in range(24)}
+    numpy = aggregate.np
+    print("sites   row loop     numpy    arrays" if numpy is not None else "sites   row loop    arrays  (NumPy is not installed)")
+    for n in (1, 5, 20):
+        sites = {f"s{k}": make_series(731, tz, rnd, end_days=8) for k in range(n)}
+        old, t_old = timed(row_loop, sites, tz, damp, 6.5, "pv_estimate")
+        results = []
+        for module in ((numpy, None) if numpy is not None else (None,)):
+            aggregate.np = module
+            new, t_new = timed(arrays, sites, tz, damp, 6.5, "pv_estimate")
+            if not same(old, new):
+                raise SystemExit(f"aggregate_sites differs from the row loop with {n} sites")
+            results.append(f"{t_new:6.0f} ms")
+        aggregate.np = numpy
+        print(f"{n:5d}  {t_old:6.0f} ms  " + "  ".join(results))
+
+if __name__ == "__main__":
+    main()
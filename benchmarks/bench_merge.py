@@ -0,0 +1,38 @@
+"""Time merging one poll into site histories of growing length.
+
+A poll brings 504 rows, 7 days of estimated actuals overlapping the history
+and 3.5 days of new forecasts after it. The merge only walks the history
+from the first fetched period, so its cost should stay flat as the history
+grows.
+
+    python benchmarks/bench_merge.py
+"""
+import random
+import time
+from datetime import timezone
+
+from common import load, make_series
+
+ForecastSeries = load("forecasts").ForecastSeries
+
+def main():
+    rnd = random.Random(4)
+    fetched = 504
+    print(f"Merging {fetched} rows into a site history:")
+    for rows in (1000, 10000, 35000, 100000):
+        #whole days, the history ends now and the fetched rows start 7 days back
+        history = make_series(rows // 48, timezone.utc, rnd, end_days=0)
+        poll = make_series(7, timezone.utc, rnd, end_days=3.5)
+        poll = ForecastSeries(poll.period[-fetched:], {f: c[-fetched:] for f, c in poll.columns.items()})
+
+        best = None
+        for _ in range(20):
+            series = history.copy()
+            t = time.perf_counter()
+            series.merge(poll)
+            took = time.perf_counter() - t
+            best = took if best is None else min(best, took)
+        print(f"  {len(history):>7,} rows  {best * 1000:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Time decoding a period_end column of a Solcast response.
+
+Compares parse_period_ends with the per-row isodate parse, astimezone,
+replace and timedelta subtraction it replaced, on 336 rows in the fixed
+YYYY-MM-DDTHH:MM:SS.0000000Z shape Solcast sends. Both must give the same
+period starts, also for offset and non-fractional timestamps.
+
+    python benchmarks/bench_period_ends.py
+"""
+import time
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+
+from isodate import parse_datetime
+
+from common import load
+
+parse_period_ends = load("forecasts").parse_period_ends
+
+def isodate_path(values):
+    ret = []
+    for v in values:
+        z = parse_datetime(v).astimezone(timezone.utc)
+        z = z.replace(second=0, microsecond=0) - timedelta(minutes=30)
+        if z.minute not in {0, 30}:
+            raise ValueError(f"Solcast period_start minute is not 0 or 30. {z.minute}")
+        ret.append(int(z.timestamp()))
+    return ret
+
+def best_of(fn, values, repeat=50):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(values)
+        took = time.perf_counter() - t
+        best = took if best is None else min(best, took)
+    return best
+
+def main():
+    start = dt.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    values = [(start + timedelta(minutes=30 * i)).strftime("%Y-%m-%dT%H:%M:%S.0000000Z") for i in range(1, 337)]
+    others = ["2024-03-31T01:30:00+10:00", "2024-03-31T02:00:00Z", "2024-10-06T03:00:00.0000000+00:00"]
+    for v in (values, others):
+        if list(parse_period_ends(v)) != isodate_path(v):
+            raise SystemExit("parse_period_ends differs from the isodate path")
+
+    old = best_of(isodate_path, values)
+    new = best_of(parse_period_ends, values)
+    print(f"Decoding {len(values)} period_end values:")
+    print(f"  isodate + astimezone + replace  {old * 1000:6.2f} ms")
+    print(f"  parse_period_ends               {new * 1000:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Shared set up of the benchmarks.
+
+The modules of the integration are loaded straight from custom_components/solcast,
+without the integration set up in its __init__, so Home Assistant is not needed.
+"""
+import importlib
+import sys
+import types
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+from pathlib import Path
+
+PACKAGE = Path(__file__).resolve().parents[1] / "custom_components" / "solcast"
+
+def load(name: str):
+    """Import a module of the integration by name, like forecasts or aggregate"""
+    if "solcast" not in sys.modules:
+        pkg = types.ModuleType("solcast")
+        pkg.__path__ = [str(PACKAGE)]
+        sys.modules["solcast"] = pkg
+    return importlib.import_module(f"solcast.{name}")
+
+def make_series(days: int, tz, rnd, end_days: int = 7):
+    """Return a ForecastSeries of random half-hour rows from days ago until end_days ahead, with a few gaps"""
+    ForecastSeries = load("forecasts").ForecastSeries
+    now = dt.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    series = ForecastSeries()
+    t = now - timedelta(days=days) + timedelta(minutes=30 * rnd.randint(0, 3))
+    while t < now + timedelta(days=end_days):
+        h = t.astimezone(tz).hour
+        v = round(rnd.uniform(0, 3), 4) if 6 <= h <= 18 else 0.0
+        if rnd.random() > 0.01:
+            series.append({"period_start": t, "pv_estimate": v, "pv_estimate10": round(v * 0.7, 4), "pv_estimate90": round(v * 1.2, 4)})
+        t += timedelta(minutes=30)
+    return series
@@ -4,14 +4,14 @@ import logging
 
 from homeassistant import loader
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_API_KEY, Platform
+from homeassistant.const import CONF_API_KEY, EVENT_HOMEASSISTANT_CLOSE, Platform
 from homeassistant.core import (HomeAssistant,
                                 ServiceCall,
                                 ServiceResponse,
                                 SupportsResponse,)
 from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
 from homeassistant.helpers import config_validation as cv
-from homeassistant.helpers import aiohttp_client, intent
+from homeassistant.helpers import intent
 from homeassistant.helpers.device_registry import async_get as device_registry
 from homeassistant.util import dt as dt_util
 
@@ -20,15 +20,24 @@ from .const import (
     SERVICE_CLEAR_DATA, 
     SERVICE_UPDATE, 
     SERVICE_QUERY_FORECAST_DATA, 
+    SERVICE_QUERY_FORECAST_ENERGY,
     SERVICE_SET_DAMPENING, 
     SERVICE_SET_HARD_LIMIT,
     SERVICE_REMOVE_HARD_LIMIT,
     SOLCAST_URL,
     CUSTOM_HOUR_SENSOR,
-    KEY_ESTIMATE
+    KEY_ESTIMATE,
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_FETCH_SPACING,
+    DEFAULT_MIN_UPDATE_INTERVAL,
+    FETCH_CONCURRENCY,
+    FETCH_SPACING,
+    MIN_UPDATE_INTERVAL,
+    AUTO_UPDATE,
 )
 
 from .coordinator import SolcastUpdateCoordinator
+from .httpclient import SolcastHttpClient
 from .solcastapi import ConnectionOptions, SolcastApi
 
 from typing import Final
@@ -95,14 +104,25 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         entry.options[CUSTOM_HOUR_SENSOR],
         entry.options.get(KEY_ESTIMATE,"estimate"),
         (entry.options.get(HARD_LIMIT,100000)/1000),
+        entry.options.get(FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY),
+        entry.options.get(FETCH_SPACING, DEFAULT_FETCH_SPACING),
+        entry.options.get(MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL),
+        entry.options.get(AUTO_UPDATE, False),
     )
 
-    solcast = SolcastApi(aiohttp_client.async_get_clientsession(hass), options)
+    solcast = SolcastApi(SolcastHttpClient(), options)
+
+    async def close_client(event):
+        await solcast.close()
+
+    #entries are not unloaded when Home Assistant stops, the client session is closed with it
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, close_client))
     
     try:
         await solcast.sites_data()
         #await solcast.sites_usage()
     except Exception as ex:
+        await solcast.close()
         raise ConfigEntryNotReady(f"Getting sites data failed: {ex}") from ex
 
     await solcast.load_saved_data()
@@ -159,6 +179,23 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
         return None
     
+    async def handle_service_get_solcast_energy(call: ServiceCall) -> ServiceResponse:
+        """Handle service call"""
+        try:
+            _LOGGER.info(f"SOLCAST - Service call: {SERVICE_QUERY_FORECAST_ENERGY}")
+
+            start = call.data.get(EVENT_START_DATETIME, dt_util.now())
+            end = call.data.get(EVENT_END_DATETIME, dt_util.now())
+
+            d = await coordinator.service_query_forecast_energy(dt_util.as_utc(start), dt_util.as_utc(end))
+        except intent.IntentHandleError as err:
+            raise HomeAssistantError(f"Error processing {SERVICE_QUERY_FORECAST_ENERGY}: {err}") from err
+
+        if call.return_response:
+            return {"data": d}
+
+        return None
+    
     async def handle_service_set_dampening(call: ServiceCall):
         """Handle service call"""
         try:
@@ -187,7 +224,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                             d.update({f"{i}": float(sp[i])})
                             opt[f"damp{i:02}"] = float(sp[i])
 
-                        solcast._damp = d
+                        #applied to the forecasts in memory, the options update below needs no reload
+                        await coordinator.set_dampening(d)
                         hass.config_entries.async_update_entry(entry, options=opt)
 
             #why is this here?? why did i make it delete the file when changing the damp factors??
@@ -245,6 +283,10 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         DOMAIN, SERVICE_QUERY_FORECAST_DATA, handle_service_get_solcast_data, SERVICE_QUERY_SCHEMA, SupportsResponse.ONLY,
     )
 
+    hass.services.async_register(
+        DOMAIN, SERVICE_QUERY_FORECAST_ENERGY, handle_service_get_solcast_energy, SERVICE_QUERY_SCHEMA, SupportsResponse.ONLY,
+    )
+
     hass.services.async_register(
         DOMAIN, SERVICE_SET_DAMPENING, handle_service_set_dampening, SERVICE_DAMP_SCHEMA
     )
@@ -263,11 +305,14 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator: SolcastUpdateCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator.unload()
+        await coordinator.solcast.close()
 
     hass.services.async_remove(DOMAIN, SERVICE_UPDATE)
     hass.services.async_remove(DOMAIN, SERVICE_CLEAR_DATA)
     hass.services.async_remove(DOMAIN, SERVICE_QUERY_FORECAST_DATA)
+    hass.services.async_remove(DOMAIN, SERVICE_QUERY_FORECAST_ENERGY)
     hass.services.async_remove(DOMAIN, SERVICE_SET_DAMPENING)
     hass.services.async_remove(DOMAIN, SERVICE_SET_HARD_LIMIT)
     hass.services.async_remove(DOMAIN, SERVICE_REMOVE_HARD_LIMIT)
@@ -281,15 +326,42 @@ async def async_remove_config_entry_device(hass: HomeAssistant, entry: ConfigEnt
 
 async def async_update_options(hass: HomeAssistant, entry: ConfigEntry):
     """Handle options update. Only reload is any item was changed"""
-    if any(
-        entry.data.get(attrib) != entry.options.get(attrib)
+    coordinator: SolcastUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    changed = [
+        attrib
         for attrib in (DAMP_FACTOR, HARD_LIMIT,KEY_ESTIMATE, CUSTOM_HOUR_SENSOR, CONF_API_KEY)
-    ):
+        if entry.data.get(attrib) != entry.options.get(attrib)
+    ]
+    if changed:
         # update entry replacing data with new options
         hass.config_entries.async_update_entry(
             entry, data={**entry.data, **entry.options}
         )
-        await hass.config_entries.async_reload(entry.entry_id)
+        if not set(changed) <= {HARD_LIMIT, KEY_ESTIMATE}:
+            await hass.config_entries.async_reload(entry.entry_id)
+            return
+
+        #these only change how the forecasts in memory are combined, so no reload
+        if HARD_LIMIT in changed:
+            await coordinator.set_hard_limit(entry.options.get(HARD_LIMIT, 100000) / 1000)
+        if KEY_ESTIMATE in changed:
+            #every estimate field is already built, switch to another one
+            await coordinator.set_estimate_field(entry.options[KEY_ESTIMATE])
+
+    #the fetch settings are read on every poll
+    coordinator.solcast.options.fetch_concurrency = entry.options.get(FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY)
+    coordinator.solcast.options.fetch_spacing = entry.options.get(FETCH_SPACING, DEFAULT_FETCH_SPACING)
+    coordinator.solcast.options.min_update_interval = entry.options.get(MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL)
+    if entry.options.get(AUTO_UPDATE, False) != coordinator.solcast.options.auto_update:
+        coordinator.solcast.options.auto_update = entry.options.get(AUTO_UPDATE, False)
+        await coordinator.plan_auto_update()
+
+    #the dampening factors from the options flow are not compared above
+    optdamp = {
+        str(a): entry.options.get(f"damp{str(a).zfill(2)}", 1.0) for a in range(0,24)
+    }
+    if optdamp != coordinator.solcast._damp:
+        await coordinator.set_dampening(optdamp)
 
 async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Migrate old entry."""
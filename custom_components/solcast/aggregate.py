@@ -0,0 +1,141 @@
+"""Combine the forecasts of the rooftop sites into one dampened series.
+
+Every site series is a run of half-hour periods, so the sites are aligned on
+a common slot grid and the hourly dampening factors and the hard limit are
+applied as array operations. NumPy is used when it is installed, otherwise
+the same steps run over plain arrays.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime as dt
+from datetime import tzinfo
+from typing import Dict
+
+from .forecasts import FIELDS, ForecastSeries
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SLOT = 1800
+
+def local_hours(start: int, count: int, tz: tzinfo) -> array:
+    """Return the local hour of day of count half-hour slots from the epoch start"""
+    ret = array("b")
+    end = start + count * SLOT
+    for s in range(start, end, 86400):
+        e = min(s + 86400, end)
+        first = dt.fromtimestamp(s, tz).utcoffset()
+        if first == dt.fromtimestamp(e - SLOT, tz).utcoffset():
+            off = int(first.total_seconds())
+            ret.extend(((p + off) // 3600) % 24 for p in range(s, e, SLOT))
+        else:
+            #a DST change during the day
+            ret.extend(dt.fromtimestamp(p, tz).hour for p in range(s, e, SLOT))
+    return ret
+
+def _round4(x):
+    """Round a NumPy array to 4 decimals exactly like round(x, 4) does"""
+    y = x * 10000.0
+    ret = np.rint(y) / 10000.0
+    #the scaled value can land either side of a tie, those few are rounded by Python
+    near = np.abs(y - np.floor(y) - 0.5) < 1e-6
+    if near.any():
+        ret[near] = [round(v, 4) for v in x[near].tolist()]
+    return ret
+
+def aggregate_sites(
+    sites: Dict[str, ForecastSeries],
+    start: int,
+    end: int,
+    tz: tzinfo,
+    damp: Dict[str, float],
+    hard_limit: float,
+) -> ForecastSeries:
+    """Sum the dampened site forecasts with start <= period_start < end.
+
+    Each site is added to the running total of its slots in site order, with
+    the total rounded to 4 decimals and capped at the hard limit after every
+    addition.
+    """
+    #the grid starts at the first half hour slot on or after start
+    g0 = -(-start // SLOT) * SLOT
+    count = max(0, -(-(end - g0) // SLOT))
+    hours = local_hours(g0, count, tz)
+    factors = [damp[f"{h}"] for h in range(24)]
+
+    if np is not None:
+        return _aggregate_numpy(sites, g0, end, count, hours, factors, hard_limit)
+    return _aggregate_python(sites, g0, end, count, hours, factors, hard_limit)
+
+def tally_sites(
+    sites: Dict[str, ForecastSeries],
+    today: tuple[int, int],
+    tz: tzinfo,
+    damp: Dict[str, float],
+    hard_limit: float,
+    field: str,
+) -> Dict[str, float]:
+    """Return the dampened energy of each site over the today period bounds"""
+    g0 = -(-today[0] // SLOT) * SLOT
+    hours = local_hours(g0, max(0, -(-(today[1] - g0) // SLOT)), tz)
+    tallies = {}
+    for s, series in sites.items():
+        a, b = _window(series, *today)
+        col = series.column(field)
+        tallies[s] = round(
+            sum(
+                min(col[i] * 0.5 * damp[f"{hours[(series.period[i] - g0) // SLOT]}"], hard_limit)
+                for i in range(a, b)
+            ),
+            4,
+        )
+    return tallies
+
+def _window(series: ForecastSeries, start: int, end: int) -> tuple[int, int]:
+    a = bisect_left(series.period, start)
+    return a, bisect_left(series.period, end, a)
+
+def _aggregate_numpy(sites, g0, end, count, hours, factors, hard_limit):
+    dampf = np.array(factors)[np.frombuffer(hours, dtype=np.int8)]
+    present = np.zeros(count, dtype=bool)
+    acc = {f: np.zeros(count) for f in FIELDS}
+
+    for series in sites.values():
+        a, b = _window(series, g0, end)
+        idx = (np.frombuffer(series.period, dtype=np.int64)[a:b] - g0) // SLOT
+        d = dampf[idx]
+        present[idx] = True
+        for f in FIELDS:
+            v = np.frombuffer(series.columns[f], dtype=np.float64)[a:b]
+            acc[f][idx] = np.minimum(_round4(acc[f][idx] + v * d), hard_limit)
+
+    slots = np.flatnonzero(present)
+    return ForecastSeries(
+        array("q", (slots * SLOT + g0).tolist()),
+        {f: array("d", acc[f][slots].tolist()) for f in FIELDS},
+    )
+
+def _aggregate_python(sites, g0, end, count, hours, factors, hard_limit):
+    dampf = array("d", (factors[h] for h in hours))
+    present = bytearray(count)
+    acc = {f: array("d", bytes(8 * count)) for f in FIELDS}
+
+    for series in sites.values():
+        a, b = _window(series, g0, end)
+        idx = [(p - g0) // SLOT for p in series.period[a:b]]
+        for i in idx:
+            present[i] = 1
+        for f in FIELDS:
+            total = acc[f]
+            for i, v in zip(idx, series.columns[f][a:b]):
+                total[i] = min(round(total[i] + v * dampf[i], 4), hard_limit)
+
+    slots = [i for i in range(count) if present[i]]
+    return ForecastSeries(
+        array("q", (i * SLOT + g0 for i in slots)),
+        {f: array("d", (acc[f][i] for i in slots)) for f in FIELDS},
+    )
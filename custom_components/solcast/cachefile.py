@@ -0,0 +1,65 @@
+"""Binary cache file for the Solcast forecast history.
+
+A cache file is a sequence of frames. The snapshot holds a single frame with
+every site and the journal gets one frame appended per write. A frame is a
+fixed header, a small JSON document with the frame metadata and the site row
+counts, followed by the rows of each site as written by ForecastSeries.write.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict
+
+from .forecasts import ForecastSeries
+
+_CACHE_VERSION = 5
+_MAGIC = b"SOLC"
+#magic, cache version, metadata length
+_HEADER = struct.Struct("<4sHI")
+
+def write_frame(file, data: Dict[str, Any]):
+    """Write data shaped like SolcastApi._data as one frame"""
+    sites = {}
+    for s, siteinfo in data["siteinfo"].items():
+        sites[s] = {k: v for k, v in siteinfo.items() if k != "forecasts"}
+        sites[s]["count"] = len(siteinfo["forecasts"])
+
+    meta = json.dumps({"last_updated": data.get("last_updated"), "sites": sites}).encode()
+    file.write(_HEADER.pack(_MAGIC, _CACHE_VERSION, len(meta)))
+    file.write(meta)
+    for siteinfo in data["siteinfo"].values():
+        siteinfo["forecasts"].write(file)
+
+def read_frame(file) -> Dict[str, Any] | None:
+    """Read the next frame, None at the end of the file"""
+    header = file.read(_HEADER.size)
+    if len(header) == 0:
+        return None
+    if len(header) < _HEADER.size:
+        raise EOFError("truncated frame header")
+
+    magic, version, length = _HEADER.unpack(header)
+    if magic != _MAGIC or version != _CACHE_VERSION:
+        raise ValueError(f"unknown cache frame {magic} version {version}")
+
+    meta = json.loads(file.read(length))
+    siteinfo = {}
+    for s, site in meta["sites"].items():
+        count = site.pop("count")
+        siteinfo[s] = {**site, "forecasts": ForecastSeries.read(file, count)}
+
+    return {"last_updated": meta["last_updated"], "siteinfo": siteinfo}
+
+def read_frames(filepath) -> tuple[list, bool]:
+    """Read every frame of a cache file, stopping at the first torn or corrupt one"""
+    frames = []
+    with open(filepath, "rb") as file:
+        while True:
+            try:
+                frame = read_frame(file)
+            except (EOFError, ValueError, struct.error):
+                return frames, False
+            if frame is None:
+                return frames, True
+            frames.append(frame)
@@ -13,7 +13,18 @@ from homeassistant.helpers.selector import (
     SelectSelectorMode,
 )
 from homeassistant import config_entries
-from .const import DOMAIN, CONFIG_OPTIONS, CUSTOM_HOUR_SENSOR
+from .const import (
+    DOMAIN,
+    CONFIG_OPTIONS,
+    CUSTOM_HOUR_SENSOR,
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_FETCH_SPACING,
+    DEFAULT_MIN_UPDATE_INTERVAL,
+    FETCH_CONCURRENCY,
+    FETCH_SPACING,
+    MIN_UPDATE_INTERVAL,
+    AUTO_UPDATE,
+)
 
 @config_entries.HANDLERS.register(DOMAIN)
 class SolcastSolarFlowHandler(ConfigFlow, domain=DOMAIN):
@@ -125,6 +136,10 @@ class SolcastSolarOptionFlowHandler(OptionsFlow):
             k = user_input["api_key"].replace(" ","").strip()
             k = ','.join([s for s in k.split(',') if s])
             allConfigData["api_key"] = k
+            allConfigData[FETCH_CONCURRENCY] = user_input[FETCH_CONCURRENCY]
+            allConfigData[FETCH_SPACING] = user_input[FETCH_SPACING]
+            allConfigData[MIN_UPDATE_INTERVAL] = user_input[MIN_UPDATE_INTERVAL]
+            allConfigData[AUTO_UPDATE] = user_input[AUTO_UPDATE]
 
             self.hass.config_entries.async_update_entry(
                 self.config_entry,
@@ -141,6 +156,22 @@ class SolcastSolarOptionFlowHandler(OptionsFlow):
                         CONF_API_KEY,
                         default=self.config_entry.options.get(CONF_API_KEY),
                     ): str,
+                    vol.Required(
+                        FETCH_CONCURRENCY,
+                        default=self.config_entry.options.get(FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1,max=10)),
+                    vol.Required(
+                        FETCH_SPACING,
+                        default=self.config_entry.options.get(FETCH_SPACING, DEFAULT_FETCH_SPACING),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0,max=60)),
+                    vol.Required(
+                        MIN_UPDATE_INTERVAL,
+                        default=self.config_entry.options.get(MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0,max=86400)),
+                    vol.Required(
+                        AUTO_UPDATE,
+                        default=self.config_entry.options.get(AUTO_UPDATE, False),
+                    ): bool,
                 }
             ),
         )
@@ -17,10 +17,21 @@ ATTRIBUTION: Final = "Data retrieved from Solcast"
 
 CUSTOM_HOUR_SENSOR = "customhoursensor"
 KEY_ESTIMATE = "key_estimate"
+#rooftop sites polled at once per API key, and the seconds between their requests
+FETCH_CONCURRENCY = "fetch_concurrency"
+FETCH_SPACING = "fetch_spacing"
+DEFAULT_FETCH_CONCURRENCY = 1
+DEFAULT_FETCH_SPACING = 3
+#an update requested this soon after the last successful one keeps the current data, 0 to always update
+MIN_UPDATE_INTERVAL = "min_update_interval"
+DEFAULT_MIN_UPDATE_INTERVAL = 0
+#update the forecasts automatically, spreading the daily API quota over the day
+AUTO_UPDATE = "auto_update"
 
 SERVICE_UPDATE = "update_forecasts"
 SERVICE_CLEAR_DATA = "clear_all_solcast_data"
 SERVICE_QUERY_FORECAST_DATA = "query_forecast_data"
+SERVICE_QUERY_FORECAST_ENERGY = "query_forecast_energy"
 SERVICE_SET_DAMPENING = "set_dampening"
 SERVICE_SET_HARD_LIMIT = "set_hard_limit"
 SERVICE_REMOVE_HARD_LIMIT = "remove_hard_limit"
@@ -1,19 +1,67 @@
 """The Solcast PV Forecast integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
 import traceback
+from datetime import datetime as dt
+from datetime import timedelta, timezone
 
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.event import async_track_utc_time_change
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_time_change,
+    async_track_utc_time_change,
+)
 
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
 from .const import DOMAIN
+from .planner import next_poll_time, polls_left, spread
 from .solcastapi import SolcastApi
 
 _LOGGER = logging.getLogger(__name__)
 
+#sensor values only move when new data is built or the clock crosses a quarter hour,
+#power now switches slot at :15 and :45 and local midnight can fall on a quarter hour
+_SNAPSHOT_SLOT_SECONDS = 900
+#sensors read straight from the API state, which changes without new data being built
+_UNSNAPSHOTTED = {"api_counter", "api_limit", "lastupdated"}
+
+#the automatic update plan is made again this soon when the API usage could not be read
+_USAGE_RETRY = timedelta(minutes=15)
+
+#when the value of a sensor can next change without new data
+#  period: the nearest forecast period switches at :15 and :45 UTC
+#  hour: the forecast hours are UTC hours
+#  local_half_hour: the remaining forecast of today starts at the current local half hour
+#  local_day: the day sensors move on at local midnight
+#sensors not listed here only change when new data is built
+SENSOR_CADENCE = {
+    "power_now": "period",
+    "power_now_30m": "period",
+    "power_now_1hr": "period",
+    "power_now_12hr": "period",
+    "power_now_24hr": "period",
+    "forecast_this_hour": "hour",
+    "forecast_next_hour": "hour",
+    "forecast_custom_hour": "hour",
+    "forecast_next_12hour": "hour",
+    "forecast_next_24hour": "hour",
+    "get_remaining_today": "local_half_hour",
+    "total_kwh_forecast_today": "local_day",
+    "total_kwh_forecast_tomorrow": "local_day",
+    "total_kwh_forecast_d3": "local_day",
+    "total_kwh_forecast_d4": "local_day",
+    "total_kwh_forecast_d5": "local_day",
+    "total_kwh_forecast_d6": "local_day",
+    "total_kwh_forecast_d7": "local_day",
+    "peak_w_today": "local_day",
+    "peak_w_time_today": "local_day",
+    "peak_w_tomorrow": "local_day",
+    "peak_w_time_tomorrow": "local_day",
+}
+
 class SolcastUpdateCoordinator(DataUpdateCoordinator):
     """Class to manage fetching data from Solcast PV Forecast API."""
 
@@ -23,6 +71,15 @@ class SolcastUpdateCoordinator(DataUpdateCoordinator):
         self._hass = hass
         self._previousenergy = None
         self._version = version
+        self._snapshot = {}
+        self._snapshot_key = None
+        self._unsub_trackers = []
+        self._suppressed_writes = 0
+        #the forecast update in progress, shared by every caller that arrives meanwhile
+        self._update_task = None
+        self._skipped_updates = 0
+        self._unsub_auto_update = None
+        self._next_auto_update = None
 
         super().__init__(
             hass,
@@ -41,11 +98,79 @@ class SolcastUpdateCoordinator(DataUpdateCoordinator):
 
         try:
             #4.0.18 - added reset usage call to reset usage sensors at UTC midnight
-            async_track_utc_time_change(self._hass, self.update_utcmidnight_usage_sensor_data, hour=0,minute=0,second=0)
-            async_track_utc_time_change(self._hass, self.update_integration_listeners, second=0)
+            self._unsub_trackers.append(
+                async_track_utc_time_change(self._hass, self.update_utcmidnight_usage_sensor_data, hour=0,minute=0,second=0)
+            )
+            #fold the solcast.json journal into a new snapshot overnight
+            self._unsub_trackers.append(
+                async_track_time_change(self._hass, self.compact_solcast_data, hour=2, minute=30, second=0)
+            )
+            #sensors are woken when their value can change rather than every minute
+            self.schedule_sensor_update()
+            if self.solcast.options.auto_update:
+                self._hass.async_create_task(self.plan_auto_update())
         except Exception as error:
             _LOGGER.error("SOLCAST - Error coordinator setup: %s", traceback.format_exc())
 
+    def unload(self):
+        """Cancel the time trackers of the coordinator"""
+        for unsub in self._unsub_trackers:
+            unsub()
+        self._unsub_trackers = []
+        if self._update_task is not None:
+            self._update_task.cancel()
+        self.cancel_auto_update()
+
+    def sensor_cadences_at(self, when: dt) -> set:
+        """Return the cadences with a boundary at the given UTC quarter hour"""
+        local = when.astimezone(self.solcast._tz)
+        ret = set()
+        if when.minute in (15, 45):
+            ret.add("period")
+        if when.minute == 0:
+            ret.add("hour")
+        if local.minute in (0, 30):
+            ret.add("local_half_hour")
+        #compare dates, local midnight does not exist on some DST changes
+        if local.date() != (when - timedelta(minutes=15)).astimezone(self.solcast._tz).date():
+            ret.add("local_day")
+        return ret
+
+    def next_sensor_update(self, now: dt) -> tuple[dt, set]:
+        """Return the next instant a sensor value can change and the cadences due then"""
+        #local offsets are multiples of 15 minutes, so every boundary is a UTC quarter hour
+        when = now.replace(minute=now.minute // 15 * 15, second=0, microsecond=0)
+        for _ in range(96):
+            when += timedelta(minutes=15)
+            cadences = self.sensor_cadences_at(when)
+            if cadences:
+                break
+        return when, cadences
+
+    def schedule_sensor_update(self):
+        when, cadences = self.next_sensor_update(dt.now(timezone.utc))
+
+        @callback
+        def sensor_update_due(*args):
+            self._unsub_trackers.remove(unsub)
+            try:
+                self.async_update_listeners_for(
+                    {k for k, c in SENSOR_CADENCE.items() if c in cadences}
+                )
+            except Exception:
+                _LOGGER.error("SOLCAST - sensor_update_due: %s", traceback.format_exc())
+            self.schedule_sensor_update()
+
+        unsub = async_track_point_in_utc_time(self._hass, sensor_update_due, when)
+        self._unsub_trackers.append(unsub)
+
+    @callback
+    def async_update_listeners_for(self, keys: set):
+        """Update only the listeners of the given sensor keys"""
+        for update_callback, context in list(self._listeners.values()):
+            if context in keys:
+                update_callback()
+
 
     async def update_integration_listeners(self, *args):
         try:
@@ -62,21 +187,181 @@ class SolcastUpdateCoordinator(DataUpdateCoordinator):
             #_LOGGER.error("SOLCAST - update_utcmidnight_usage_sensor_data: %s", traceback.format_exc())
             pass
 
+    async def compact_solcast_data(self, *args):
+        try:
+            await self.solcast.compact_data()
+        except Exception:
+            _LOGGER.error("SOLCAST - compact_solcast_data: %s", traceback.format_exc())
+
     async def service_event_update(self, *args):
-        #await self.solcast.sites_weather()
-        await self.solcast.http_data(dopast=False)
-        await self.update_integration_listeners()
+        """Update the forecasts, once for overlapping callers.
+
+        A caller that arrives while an update runs waits for that update rather
+        than starting another. Within min_update_interval seconds of the last
+        successful update the current data is kept.
+        """
+        if self._update_task is None:
+            if self.updated_recently():
+                self._skipped_updates += 1
+                _LOGGER.info(f"SOLCAST - Forecasts were updated less than {self.solcast.options.min_update_interval}s ago, keeping them")
+                return
+            self._update_task = self._hass.async_create_task(self.update_forecasts())
+        else:
+            self._skipped_updates += 1
+            _LOGGER.debug("SOLCAST - Forecast update already in progress, waiting for it")
+        #a cancelled caller leaves the update running for the others
+        await asyncio.shield(self._update_task)
+
+    def first_light(self) -> dt | None:
+        """Return the start of the next daylight window when it is night, else None.
+
+        Without forecasts or site locations to find it from it is never night.
+        """
+        if not self.solcast._loaded_data:
+            return None
+        now = dt.now(timezone.utc)
+        window = self.solcast.get_daylight_window(now)
+        if window is None or window[0] <= now:
+            return None
+        return window[0]
+
+    def updated_recently(self) -> bool:
+        interval = self.solcast.options.min_update_interval
+        try:
+            last = dt.fromisoformat(self.solcast._data["last_updated"])
+            return interval > 0 and (dt.now(timezone.utc) - last).total_seconds() < interval
+        except Exception:
+            return False
+
+    async def update_forecasts(self):
+        try:
+            #await self.solcast.sites_weather()
+            await self.solcast.http_data(dopast=False)
+            await self.update_integration_listeners()
+        finally:
+            self._update_task = None
+
+    def cancel_auto_update(self):
+        if self._unsub_auto_update is not None:
+            self._unsub_auto_update()
+            self._unsub_auto_update = None
+        self._next_auto_update = None
+
+    async def plan_auto_update(self, *args):
+        """Schedule the next automatic update within the daily API quota.
+
+        The usage of every API key is read again before each plan, so calls
+        made elsewhere with the same keys are accounted for. Once the quota is
+        spent, or no period left today is worth a call, the plan is made again
+        after the quota resets at UTC midnight. When the usage cannot be read
+        the plan is made again after _USAGE_RETRY.
+        """
+        self.cancel_auto_update()
+        if not self.solcast.options.auto_update:
+            return
+
+        retry = None
+        try:
+            await self.solcast.sites_usage()
+            #the usage sensors show what was read
+            await self.update_integration_listeners()
+            sites = {}
+            for site in self.solcast._sites:
+                sites[site['apikey']] = sites.get(site['apikey'], 0) + 1
+
+            now = dt.now(timezone.utc)
+            reset = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            polls = polls_left(self.solcast._api_usage, sites)
+            if polls is None:
+                when = None
+                retry = now + _USAGE_RETRY
+            else:
+                when = next_poll_time(int(now.timestamp()), int(reset.timestamp()), self.solcast._data_forecasts, polls)
+            #calls are only spent in daylight
+            if when is not None:
+                window = self.solcast.get_daylight_window(dt.fromtimestamp(when, timezone.utc))
+                if window is not None:
+                    when = max(when, int(window[0].timestamp()))
+                #periods and first light are on the half hour for every install
+                when = spread(when)
+        except Exception:
+            _LOGGER.error("SOLCAST - plan_auto_update: %s", traceback.format_exc())
+            when = None
+            retry = dt.now(timezone.utc) + _USAGE_RETRY
+
+        poll = when is not None and when < reset.timestamp()
+        if poll:
+            self._next_auto_update = dt.fromtimestamp(when, timezone.utc)
+            _LOGGER.info(f"SOLCAST - Next automatic update at {self._next_auto_update}, {polls} updates left in the API limit today")
+        elif retry is not None:
+            self._next_auto_update = retry
+            _LOGGER.warning(f"SOLCAST - API usage could not be read, planning the automatic update again at {retry}")
+        else:
+            #a few minutes late so the usage has been reset
+            self._next_auto_update = dt.fromtimestamp(spread(int((reset + timedelta(minutes=5)).timestamp())), timezone.utc)
+            _LOGGER.info(f"SOLCAST - No automatic update before the API limit resets, planning again at {self._next_auto_update}")
+
+        async def auto_update_due(*args):
+            self._unsub_auto_update = None
+            #the daylight window can have moved since the plan was made, automatic calls are only spent in daylight
+            first_light = self.first_light() if poll else None
+            if first_light is not None:
+                self._skipped_updates += 1
+                _LOGGER.info(f"SOLCAST - Automatic update due at night, planning it again from first light at {first_light}")
+            elif poll:
+                try:
+                    await self.service_event_update()
+                except Exception:
+                    _LOGGER.error("SOLCAST - auto_update_due: %s", traceback.format_exc())
+            await self.plan_auto_update()
+
+        self._unsub_auto_update = async_track_point_in_utc_time(self._hass, auto_update_due, self._next_auto_update)
 
     async def service_event_delete_old_solcast_json_file(self, *args):
         await self.solcast.delete_solcast_file()
+        await self.update_integration_listeners()
 
     async def service_query_forecast_data(self, *args) -> tuple:
         return await self.solcast.get_forecast_list(*args)
 
+    async def service_query_forecast_energy(self, *args) -> dict:
+        return self.solcast.get_forecast_energy(*args)
+
+    async def set_estimate_field(self, key_estimate):
+        self.solcast.set_estimate_field(key_estimate)
+        _LOGGER.info(f"SOLCAST - Switched the forecast estimate to pv_{key_estimate}")
+        self.async_update_listeners()
+
+    async def set_dampening(self, damp):
+        await self.solcast.set_dampening(damp)
+        _LOGGER.info("SOLCAST - Applied new dampening factors")
+        self.async_update_listeners()
+
+    async def set_hard_limit(self, hard_limit):
+        await self.solcast.set_hard_limit(hard_limit)
+        _LOGGER.info(f"SOLCAST - Applied a hard limit of {hard_limit}")
+        self.async_update_listeners()
+
     def get_energy_tab_data(self):
         return self.solcast.get_energy_data()
 
     def get_sensor_value(self, key=""):
+        """Return a sensor value from the snapshot of the current data generation and slot"""
+        if key in _UNSNAPSHOTTED:
+            return self.calculate_sensor_value(key)
+        snapshot_key = (
+            self.solcast._data_generation,
+            int(dt.now(timezone.utc).timestamp()) // _SNAPSHOT_SLOT_SECONDS,
+        )
+        if snapshot_key != self._snapshot_key:
+            self._snapshot = {}
+            self._snapshot_key = snapshot_key
+
+        if key not in self._snapshot:
+            self._snapshot[key] = self.calculate_sensor_value(key)
+        return self._snapshot[key]
+
+    def calculate_sensor_value(self, key=""):
         if key == "total_kwh_forecast_today":
             return self.solcast.get_total_kwh_forecast_day(0)
         elif key == "peak_w_today":
@@ -156,6 +441,12 @@ class SolcastUpdateCoordinator(DataUpdateCoordinator):
         #just in case
         return None
 
+    def get_sensor_extra_attributes_id(self, key=""):
+        """Return an id that changes whenever the extra attributes of a sensor can change"""
+        if key.startswith("total_kwh_forecast_"):
+            return (self.solcast._data_generation, dt.now(self.solcast._tz).date())
+        return None
+
     def get_site_sensor_value(self, roof_id, key):
         match key:
             case "site_data":
@@ -6,6 +6,7 @@ from typing import Any
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_API_KEY
 from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
 
 from .const import DOMAIN
 from .coordinator import SolcastUpdateCoordinator
@@ -27,8 +28,15 @@ async def async_get_config_entry_diagnostics(
         "api_request_limit": coordinator.solcast.get_api_limit(),
         "rooftop_site_count": len(coordinator.solcast._sites),
         "forecast_hard_limit_set": coordinator.solcast._hardlimit < 100,
-        "data": (coordinator.data, TO_REDACT),
+        "data": (coordinator.solcast.get_data_export(), TO_REDACT),
         "energy_history_graph": coordinator._previousenergy,
         "energy_forecasts_graph": coordinator.solcast._dataenergy["wh_hours"],
+        "suppressed_sensor_writes": coordinator._suppressed_writes,
+        "skipped_forecast_updates": coordinator._skipped_updates,
+        "last_poll_seconds": coordinator.solcast._last_poll_seconds,
+        "last_poll_outcomes": coordinator.solcast._poll_outcomes,
+        "next_auto_update": coordinator._next_auto_update,
+        "http_client": coordinator.solcast._client.stats(),
+        "daylight_window": coordinator.solcast.get_daylight_window(dt_util.utcnow()),
     }
     
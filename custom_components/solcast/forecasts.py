@@ -0,0 +1,266 @@
+"""Columnar storage for Solcast forecast rows."""
+from __future__ import annotations
+
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import date
+from datetime import datetime as dt
+from datetime import timedelta, tzinfo
+from datetime import timezone
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List
+
+from isodate import parse_datetime
+
+FIELDS = ("pv_estimate", "pv_estimate10", "pv_estimate90")
+
+_EPOCH_DATE = date(1970, 1, 1)
+
+def parse_period_ends(values: Iterable[str]) -> array:
+    """Convert Solcast period_end strings to period_start UTC epoch seconds.
+
+    Solcast returns period_end as YYYY-MM-DDTHH:MM:SS.0000000Z, which is sliced
+    directly with the date part converted once per day. Anything else is parsed
+    by isodate. Seconds are dropped and the period starts 30 minutes earlier.
+    """
+    ret = array("q")
+    days = {}
+    for v in values:
+        if len(v) == 28 and v[10] == "T" and v[13] == ":" and v[16] == ":" and v[19:] == ".0000000Z":
+            day = days.get(v[:10])
+            if day is None:
+                day = days[v[:10]] = (date(int(v[:4]), int(v[5:7]), int(v[8:10])) - _EPOCH_DATE).days * 86400
+            p = day + int(v[11:13]) * 3600 + int(v[14:16]) * 60 - 1800
+        else:
+            p = int(parse_datetime(v).astimezone(timezone.utc).timestamp()) // 60 * 60 - 1800
+
+        if p % 1800 != 0:
+            raise ValueError(
+                f"Solcast period_start minute is not 0 or 30. {p // 60 % 60}"
+            )
+        ret.append(p)
+    return ret
+
+def local_midnight(day: date, tz: tzinfo) -> int:
+    """Return the UTC epoch of the start of a local date"""
+    return int(dt(day.year, day.month, day.day, tzinfo=tz).timestamp())
+
+def build_day_index(period: array, tz: tzinfo) -> Dict[date, tuple[int, int]]:
+    """Map each local date to the [start, end) slice of its rows in period"""
+    index = {}
+    if len(period) == 0:
+        return index
+
+    day = dt.fromtimestamp(period[0], tz).date()
+    last = dt.fromtimestamp(period[-1], tz).date()
+    start = 0
+    while day <= last:
+        day_after = day + timedelta(days=1)
+        end = bisect_left(period, local_midnight(day_after, tz), start)
+        if end > start:
+            index[day] = (start, end)
+        start = end
+        day = day_after
+    return index
+
+class ForecastSeries:
+    """Forecast rows for one rooftop site, kept as typed columns.
+
+    `period` holds the period_start of every row as UTC epoch seconds and each
+    of the pv_estimate fields is a float column of the same length. Rows read
+    back from the series are plain dicts shaped like the Solcast API rows.
+    """
+
+    __slots__ = ("period", "columns")
+
+    def __init__(self, period: array | None = None, columns: Dict[str, array] | None = None):
+        self.period = period if period is not None else array("q")
+        self.columns = columns if columns is not None else {f: array("d") for f in FIELDS}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> ForecastSeries:
+        """Build a series from dict rows with a datetime period_start."""
+        series = cls()
+        for x in rows:
+            series.append(x)
+        series.sort()
+        return series
+
+    @classmethod
+    def from_response(
+        cls,
+        rows: List[Dict[str, Any]],
+        fields: Iterable[str] = FIELDS,
+        after: int | None = None,
+        before: int | None = None,
+    ) -> ForecastSeries:
+        """Build a series from Solcast API rows with after < period_start < before.
+
+        Only the given fields are read from the rows, the others are stored
+        as 0, like pv_estimate10 and pv_estimate90 of estimated actuals.
+        """
+        period = parse_period_ends(x["period_end"] for x in rows)
+        keep = [
+            i
+            for i, p in enumerate(period)
+            if (after is None or p > after) and (before is None or p < before)
+        ]
+        series = cls(
+            array("q", (period[i] for i in keep)),
+            {
+                f: array("d", (rows[i][f] for i in keep)) if f in fields else array("d", [0.0]) * len(keep)
+                for f in FIELDS
+            },
+        )
+        series.sort()
+        return series
+
+    @classmethod
+    def read(cls, file, count: int) -> ForecastSeries:
+        """Read count rows written by write()"""
+        period = array("i")
+        period.fromfile(file, count)
+        columns = {}
+        for f in FIELDS:
+            columns[f] = array("f")
+            columns[f].fromfile(file, count)
+
+        if sys.byteorder == "big":
+            period.byteswap()
+            for c in columns.values():
+                c.byteswap()
+
+        #Solcast values have 4 decimals, which float32 holds for anything under 800 kW
+        return cls(array("q", period), {f: array("d", (round(v, 4) for v in c)) for f, c in columns.items()})
+
+    def write(self, file):
+        """Write the rows as little-endian int32 periods and float32 columns"""
+        blocks = [array("i", self.period)] + [array("f", self.columns[f]) for f in FIELDS]
+        for b in blocks:
+            if sys.byteorder == "big":
+                b.byteswap()
+            b.tofile(file)
+
+    def __len__(self) -> int:
+        return len(self.period)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.rows()
+
+    def rows(self, start: int = 0, end: int | None = None) -> Iterator[Dict[str, Any]]:
+        for i in range(start, len(self.period) if end is None else end):
+            yield self.row(i)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return self.row(i)
+
+    def copy(self) -> ForecastSeries:
+        return ForecastSeries(self.period[:], {f: c[:] for f, c in self.columns.items()})
+
+    def cumulative(self, into: Dict[str, array] | None = None, start: int = 0) -> Dict[str, array]:
+        """Running totals of each field, the sum of rows [i, j) is c[j] - c[i].
+
+        Given the totals of an earlier call as into, the totals up to row start
+        are kept and only the rest is recomputed, in place.
+        """
+        if into is None:
+            return {f: array("d", accumulate(c, initial=0.0)) for f, c in self.columns.items()}
+
+        for f, c in self.columns.items():
+            total = into[f]
+            before = total[start]
+            del total[start:]
+            total.extend(accumulate(c[start:], initial=before))
+        return into
+
+    def column(self, field: str) -> array:
+        return self.columns[field]
+
+    def period_start(self, i: int) -> dt:
+        return dt.fromtimestamp(self.period[i], timezone.utc)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        ret = {"period_start": self.period_start(i)}
+        for f in FIELDS:
+            ret[f] = self.columns[f][i]
+        return ret
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def append(self, x: Dict[str, Any]):
+        self.period.append(int(x["period_start"].timestamp()))
+        for f in FIELDS:
+            self.columns[f].append(x[f])
+
+    def merge(self, other: ForecastSeries) -> tuple[int, int] | None:
+        """Upsert the sorted rows of other into this series.
+
+        Both series are sorted, so only the rows from the first period of other
+        onwards are walked, in a single two-pointer pass. Where other repeats a
+        period its last row wins. Returns the first and last period merged.
+        """
+        if len(other) == 0:
+            return None
+
+        p = self.period
+        start = bisect_left(p, other.period[0])
+        old_p = p[start:]
+        old_cols = [self.columns[f][start:] for f in FIELDS]
+        new_p = array("q")
+        new_cols = [array("d") for f in FIELDS]
+        other_cols = [other.columns[f] for f in FIELDS]
+
+        i = 0
+        n = len(old_p)
+        for j, e in enumerate(other.period):
+            while i < n and old_p[i] < e:
+                new_p.append(old_p[i])
+                for c, old_c in zip(new_cols, old_cols):
+                    c.append(old_c[i])
+                i += 1
+            if i < n and old_p[i] == e:
+                i += 1
+            if len(new_p) > 0 and new_p[-1] == e:
+                for c, other_c in zip(new_cols, other_cols):
+                    c[-1] = other_c[j]
+            else:
+                new_p.append(e)
+                for c, other_c in zip(new_cols, other_cols):
+                    c.append(other_c[j])
+
+        new_p.extend(old_p[i:])
+        for c, old_c in zip(new_cols, old_cols):
+            c.extend(old_c[i:])
+
+        del p[start:]
+        p.extend(new_p)
+        for f, c in zip(FIELDS, new_cols):
+            del self.columns[f][start:]
+            self.columns[f].extend(c)
+
+        return other.period[0], other.period[-1]
+
+    def prune(self, before: int) -> int:
+        """Drop the rows with a period before the given epoch, returns the number dropped"""
+        i = bisect_left(self.period, before)
+        if i > 0:
+            del self.period[:i]
+            for c in self.columns.values():
+                del c[:i]
+        return i
+
+    def keep(self, indexes: Iterable[int]):
+        """Keep only the rows at the given indexes, in that order."""
+        indexes = list(indexes)
+        self.period = array("q", (self.period[i] for i in indexes))
+        for f in FIELDS:
+            c = self.columns[f]
+            self.columns[f] = array("d", (c[i] for i in indexes))
+
+    def sort(self):
+        p = self.period
+        if all(p[i - 1] <= p[i] for i in range(1, len(p))):
+            return
+        self.keep(sorted(range(len(p)), key=p.__getitem__))
@@ -0,0 +1,138 @@
+"""HTTP client for the Solcast API."""
+from __future__ import annotations
+
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+#seconds to open a connection, and to wait for each read of the response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+#connections to api.solcast.com.au are kept open between the requests of a poll
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_SECONDS = 300
+CONNECTION_LIMIT = 10
+
+class SolcastResponse:
+    """A response read in full, with the calls of an aiohttp response used by SolcastApi"""
+
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    async def json(self, content_type=None) -> Any:
+        return json.loads(self.body) if self.body else None
+
+    async def text(self) -> str:
+        return self.body.decode(errors="replace")
+
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        for i in range(0, len(self.body), n):
+            yield self.body[i:i + n]
+
+class SolcastStream:
+    """A response whose body is read as it arrives"""
+
+    def __init__(self, resp, client: SolcastHttpClient):
+        self._resp = resp
+        self._client = client
+        self.status = resp.status
+        self.headers = resp.headers
+
+    async def json(self, content_type=None) -> Any:
+        body = await self._resp.read()
+        self._client.bytes_received += len(body)
+        return json.loads(body) if body else None
+
+    async def text(self) -> str:
+        body = await self._resp.read()
+        self._client.bytes_received += len(body)
+        return body.decode(errors="replace")
+
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        async for chunk in self._resp.content.iter_chunked(n):
+            self._client.bytes_received += len(chunk)
+            yield chunk
+
+class SolcastHttpClient:
+    """Makes the requests of SolcastApi on a session of its own.
+
+    The session pools keep-alive connections, caches DNS lookups and asks for
+    gzip responses, with separate connect and read timeouts. The count,
+    errors, bytes and latency of the requests are kept for diagnostics.
+    Anything with an async get(url, params) and an async context manager
+    stream(url, params), both giving an object with status, headers, an async
+    json(), text() and iter_chunked(), can stand in for it in tests.
+    """
+
+    def __init__(self, session: ClientSession | None = None):
+        self._session = session
+        self._owns_session = session is None
+        self.requests = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=CONNECTION_LIMIT,
+                    keepalive_timeout=KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=DNS_CACHE_SECONDS,
+                    ssl=False,
+                ),
+                timeout=ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+                headers={"Accept-Encoding": "gzip, deflate"},
+            )
+            self._owns_session = True
+        return self._session
+
+    async def get(self, url: str, params: dict | None = None) -> SolcastResponse:
+        """Request url and read the whole response"""
+        started = time.monotonic()
+        self.requests += 1
+        try:
+            async with self._get_session().get(url, params=params) as resp:
+                body = await resp.read()
+        except Exception:
+            self.errors += 1
+            raise
+        self.last_latency = round(time.monotonic() - started, 3)
+        self.total_latency += self.last_latency
+        self.bytes_received += len(body)
+        return SolcastResponse(resp.status, resp.headers, body)
+
+    @asynccontextmanager
+    async def stream(self, url: str, params: dict | None = None) -> AsyncIterator[SolcastStream]:
+        """Request url, giving the response before its body is read"""
+        started = time.monotonic()
+        self.requests += 1
+        try:
+            async with self._get_session().get(url, params=params) as resp:
+                yield SolcastStream(resp, self)
+        except Exception:
+            self.errors += 1
+            raise
+        self.last_latency = round(time.monotonic() - started, 3)
+        self.total_latency += self.last_latency
+
+    async def close(self):
+        """Close the session if the client opened it"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_received": self.bytes_received,
+            "last_latency": self.last_latency,
+            "average_latency": round(self.total_latency / (self.requests - self.errors), 3) if self.requests > self.errors else None,
+        }
@@ -0,0 +1,115 @@
+"""Incremental parsing of the row arrays in Solcast API responses."""
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, List
+
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+class ArrayItems:
+    """Pull the items of one array member of a JSON object as its text arrives.
+
+    Solcast answers with an object like {"forecasts": [{...}, ...]}. Each
+    chunk fed in returns the items completed by it, so only the item being
+    received is held as text rather than the whole response.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.count = 0
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""
+        self._pos = 0
+        self._state = "start"
+        self._name = None
+        self._found = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Add the next chunk of the response, returning the items it completed"""
+        self._text = self._text[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        items = []
+        while self._step(items):
+            pass
+        return items
+
+    def close(self):
+        """Check the whole array was received"""
+        if not self._found:
+            raise ValueError(f"Solcast response has no {self.key} list")
+        if self._state != "done":
+            raise ValueError(f"Solcast response ended inside the {self.key} list")
+
+    def _value(self):
+        #a value is only complete once the text after it has arrived, 12 could still become 123
+        try:
+            value, end = _DECODER.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            return None, None
+        if end >= len(self._text):
+            return None, None
+        return value, end
+
+    def _step(self, items: list) -> bool:
+        t = self._text
+        p = self._pos
+        while p < len(t) and t[p] in _WHITESPACE:
+            p += 1
+        self._pos = p
+        if self._state == "done" or p == len(t):
+            return False
+
+        c = t[p]
+        if self._state == "start":
+            if c != "{":
+                raise ValueError("Solcast response is not a JSON object")
+            self._pos += 1
+            self._state = "key"
+        elif self._state == "key":
+            if c == "}":
+                self._state = "done"
+                return False
+            if c == ",":
+                self._pos += 1
+                return True
+            name, end = self._value()
+            if end is None:
+                return False
+            self._name = name
+            self._pos = end
+            self._state = "colon"
+        elif self._state == "colon":
+            if c != ":":
+                raise ValueError("Solcast response is not a JSON object")
+            self._pos += 1
+            self._state = "array" if self._name == self.key else "value"
+        elif self._state == "value":
+            #another member, skipped whole
+            _, end = self._value()
+            if end is None:
+                return False
+            self._pos = end
+            self._state = "key"
+        elif self._state == "array":
+            if c != "[":
+                raise ValueError(f"{self.key} must be a list")
+            self._found = True
+            self._pos += 1
+            self._state = "items"
+        elif self._state == "items":
+            if c == "]":
+                #the rest of the response is not needed
+                self._state = "done"
+                return False
+            if c == ",":
+                self._pos += 1
+                return True
+            item, end = self._value()
+            if end is None:
+                return False
+            items.append(item)
+            self.count += 1
+            self._pos = end
+        return True
@@ -0,0 +1,130 @@
+"""Plan automatic forecast updates within the daily API quota.
+
+Every update costs one API call for each rooftop site of a key, and the quota
+of every key resets at UTC midnight. The updates a key can still afford are
+spread over the time left until then, weighted by the spread between the 10%
+and 90% estimates of each period. Forecasts move the most where they are the
+least certain, so that is where more of the calls land.
+"""
+from __future__ import annotations
+
+import random
+from bisect import bisect_left
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+from typing import Dict, Iterable
+
+from .aggregate import SLOT
+from .forecasts import ForecastSeries
+
+try:
+    from astral import Observer
+    from astral.sun import daylight
+except ImportError:
+    daylight = None
+
+#never plan two updates closer than this many seconds
+MIN_GAP = 900
+#Solcast ask that calls are not made on the minute, every install would call at the same instant
+SPREAD = (30, 360)
+#periods without generation for longer than this are a night, not a cloudy spell
+NIGHT = 3 * 3600
+
+def polls_left(usage: Dict[str, tuple], sites: Dict[str, int]) -> int | None:
+    """Return how many more updates every API key can afford today.
+
+    usage maps an API key to its (daily_limit, daily_limit_consumed) and sites
+    an API key to its number of rooftop sites. None when the usage of a key
+    is unknown.
+    """
+    ret = 0
+    for i, (key, count) in enumerate(sites.items()):
+        limit, used = usage.get(key, (None, None))
+        if limit is None or used is None:
+            return None
+        n = max(0, limit - used) // max(1, count)
+        ret = n if i == 0 else min(ret, n)
+    return ret
+
+def next_poll_time(now: int, reset: int, forecasts: ForecastSeries, polls: int) -> int | None:
+    """Return the epoch second of the next update, or None to wait for the quota reset.
+
+    The polls left split the weight of the periods from now until reset into
+    polls + 1 equal parts and the next update is due where the first part
+    ends. Without forecasts in that time the updates are spaced evenly, and
+    when every period left has no spread there is nothing worth a call.
+    """
+    if polls <= 0:
+        return None
+
+    #the current period counts from now
+    a = bisect_left(forecasts.period, now - SLOT + 1)
+    b = bisect_left(forecasts.period, reset, a)
+    if a == b:
+        return min(reset, now + max(MIN_GAP, (reset - now) // (polls + 1)))
+
+    low = forecasts.column("pv_estimate10")
+    high = forecasts.column("pv_estimate90")
+    weights = [max(0.0, high[i] - low[i]) for i in range(a, b)]
+    total = sum(weights)
+    if total <= 0:
+        return None
+
+    target = total / (polls + 1)
+    acc = 0.0
+    for i, w in zip(range(a, b), weights):
+        acc += w
+        if acc >= target:
+            return max(now + MIN_GAP, forecasts.period[i])
+    return max(now + MIN_GAP, forecasts.period[b - 1])
+
+def spread(when: int) -> int:
+    """Return the epoch second when put off by a random number of seconds within SPREAD"""
+    return when + random.randint(*SPREAD)
+
+def forecast_daylight(sites: Iterable[ForecastSeries], now: int) -> tuple[int, int] | None:
+    """Return the daylight window that contains now, or else the next one.
+
+    A window runs from the first to the end of the last period in which any
+    site forecasts generation. None when the forecasts show no more daylight.
+    """
+    light = set()
+    for series in sites:
+        col = series.column("pv_estimate")
+        a = bisect_left(series.period, now - 86400)
+        light.update(series.period[i] for i in range(a, len(series)) if col[i] > 0)
+    light = sorted(light)
+
+    #the first period not over yet, the window it is in started at the last night
+    i = bisect_left(light, now - SLOT + 1)
+    if i == len(light):
+        return None
+    while i > 0 and light[i] - light[i - 1] <= NIGHT:
+        i -= 1
+    j = i
+    while j + 1 < len(light) and light[j + 1] - light[j] <= NIGHT:
+        j += 1
+    return light[i], light[j] + SLOT
+
+def sun_daylight(coords: Iterable[tuple[float, float]], now: int) -> tuple[int, int] | None:
+    """Return the sunrise to sunset window of the sites that contains now, or else the next one"""
+    coords = list(coords)
+    if daylight is None or not coords:
+        return None
+    day = dt.fromtimestamp(now, timezone.utc).date()
+    for d in (day - timedelta(days=1), day, day + timedelta(days=1)):
+        windows = []
+        for lat, lon in coords:
+            #the day of the site, near enough to its local solar time for the sun to rise before it sets
+            solar = timezone(timedelta(hours=round(lon / 15)))
+            try:
+                rise, set_ = daylight(Observer(latitude=lat, longitude=lon), d, tzinfo=solar)
+            except ValueError:
+                #polar day or night, the sun does not rise or set
+                continue
+            windows.append((int(rise.timestamp()), int(set_.timestamp())))
+        if windows:
+            window = min(w[0] for w in windows), max(w[1] for w in windows)
+            if window[1] > now:
+                return window
+    return None
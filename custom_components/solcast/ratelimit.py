@@ -0,0 +1,70 @@
+"""Request rate limiting for the Solcast API."""
+from __future__ import annotations
+
+import asyncio
+import random
+from datetime import datetime as dt
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping
+
+class TokenBucket:
+    """Token bucket limiting the request rate of one API key.
+
+    Holds up to capacity tokens, refilled at rate tokens a second, and every
+    request takes one. A 429 response can pause the bucket for the time
+    Solcast asked for in Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = None
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, deadline: float | None = None) -> bool:
+        """Wait for a token, False when there is none before the loop time deadline"""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            self._refill(now)
+            wait = self._paused_until - now
+            if wait <= 0 and self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            wait = max(wait, (1 - self._tokens) / self.rate)
+            if deadline is not None and now + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every request for the given seconds"""
+        now = asyncio.get_running_loop().time()
+        self._refill(now)
+        self._tokens = 0
+        self._paused_until = max(self._paused_until, now + seconds)
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter, between half and all of base * 2^attempt"""
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_after_seconds(headers: Mapping[str, str] | None) -> float | None:
+    """Return the seconds asked for by a Retry-After header, in seconds or as an HTTP date"""
+    value = (headers or {}).get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - dt.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
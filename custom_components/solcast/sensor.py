@@ -282,7 +282,8 @@ class SolcastSensor(CoordinatorEntity, SensorEntity):
         entry: ConfigEntry,
     ) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator)
+        #the context lets the coordinator wake only the sensors whose value can change
+        super().__init__(coordinator, context=entity_description.key)
 
         #doesnt work :()
         if entity_description.key == "forecast_custom_hour":
@@ -307,6 +308,8 @@ class SolcastSensor(CoordinatorEntity, SensorEntity):
             self._attr_available = False
         else:
             self._attr_available = True
+
+        self._last_written = self.state_fingerprint()
         
         self._attr_device_info = {
             ATTR_IDENTIFIERS: {(DOMAIN, entry.entry_id)},
@@ -342,6 +345,14 @@ class SolcastSensor(CoordinatorEntity, SensorEntity):
         """Return if the sensor should poll."""
         return False
 
+    def state_fingerprint(self) -> tuple:
+        """Return what the written state depends on, without building the attributes"""
+        return (
+            self._sensor_data,
+            self._attr_available,
+            self.coordinator.get_sensor_extra_attributes_id(self.entity_description.key),
+        )
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
@@ -360,6 +371,12 @@ class SolcastSensor(CoordinatorEntity, SensorEntity):
         else:
             self._attr_available = True
 
+        fingerprint = self.state_fingerprint()
+        if fingerprint == self._last_written:
+            self.coordinator._suppressed_writes += 1
+            return
+        self._last_written = fingerprint
+
         self.async_write_ha_state()
 
 @dataclass
@@ -398,6 +415,9 @@ class RooftopSensor(CoordinatorEntity, SensorEntity):
                 f"SOLCAST - unable to get sensor value {ex} %s", traceback.format_exc()
             )
             self._sensor_data = None
+
+        #the site attributes only change on reload
+        self._last_written = self._sensor_data
         
         self._attr_device_info = {
             ATTR_IDENTIFIERS: {(DOMAIN, entry.entry_id)},
@@ -470,4 +490,10 @@ class RooftopSensor(CoordinatorEntity, SensorEntity):
                 f"SOLCAST - unable to get sensor value {ex} %s", traceback.format_exc()
             )
             self._sensor_data = None
+
+        if self._sensor_data == self._last_written:
+            self.coordinator._suppressed_writes += 1
+            return
+        self._last_written = self._sensor_data
+
         self.async_write_ha_state()
@@ -2,30 +2,51 @@
 from __future__ import annotations
 
 import asyncio
-import copy
 import json
 import logging
 import os
+import time
 import traceback
+from bisect import bisect_left
 from dataclasses import dataclass
 from datetime import datetime as dt
 from datetime import timedelta, timezone
-from operator import itemgetter
 from os.path import exists as file_exists
 from typing import Any, Dict, cast
 
 import async_timeout
-from aiohttp import ClientConnectionError, ClientSession
-from aiohttp.client_reqrep import ClientResponse
-from isodate import parse_datetime
+from aiohttp import ClientConnectionError
+
+from .aggregate import aggregate_sites, tally_sites
+from .cachefile import read_frames, write_frame
+from .forecasts import FIELDS, ForecastSeries, build_day_index, local_midnight
+from .httpclient import SolcastHttpClient, SolcastResponse
+from .jsonstream import ArrayItems
+from .planner import forecast_daylight, sun_daylight
+from .ratelimit import TokenBucket, backoff_delay, retry_after_seconds
 
 _JSON_VERSION = 4
+#compact the journal into a new solcast.bin once it grows past this size
+_JOURNAL_COMPACT_SIZE = 2 * 1024 * 1024
+#requests a second and burst allowed for each API key
+_API_RATE = 1.0
+_API_BURST = 5
+#failed requests are retried with backoff until this many seconds after the first try
+_FETCH_DEADLINE = 600
+_BACKOFF_BASE = 5
+_BACKOFF_CAP = 120
+#outcomes of a request that are worth retrying
+_FETCH_RETRY = {429, 500, 502, 503, 504, "timeout", "connection error"}
+#bytes of a response parsed at a time
+_CHUNK_SIZE = 16384
 _LOGGER = logging.getLogger(__name__)
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, dt):
             return o.isoformat()
+        if isinstance(o, ForecastSeries):
+            return o.to_rows()
 
 class JSONDecoder(json.JSONDecoder):
     def __init__(self, *args, **kwargs):
@@ -45,6 +66,30 @@ def open_file(filepath, mode, x):
     with open(filepath, mode) as file:
         return x(file)
 
+def replace_file(filepath, mode, x):
+    """Write a file next to filepath and move it into place"""
+    tmp = filepath + ".tmp"
+    with open(tmp, mode) as file:
+        x(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, filepath)
+
+def replay_journal(data, journal):
+    """Apply journal entries written after the loaded snapshot"""
+    for entry in journal:
+        for s, siteinfo in entry["siteinfo"].items():
+            data['siteinfo'].setdefault(s, {}).setdefault('forecasts', ForecastSeries()).merge(siteinfo['forecasts'])
+        if (entry.get("last_updated") or "") > (data.get("last_updated") or ""):
+            data["last_updated"] = entry["last_updated"]
+
+def response_rows(resp_json, path) -> list:
+    """Return the rows of the path list in a whole API response"""
+    rows = resp_json.get(path) if isinstance(resp_json, dict) else None
+    if not isinstance(rows, list):
+        raise TypeError(f"{path} must be a list, not {type(rows)}")
+    return rows
+
 @dataclass
 class ConnectionOptions:
     """Solcast API options for connection."""
@@ -57,6 +102,10 @@ class ConnectionOptions:
     customhoursensor: int
     key_estimate: str
     hard_limit: int
+    fetch_concurrency: int = 1
+    fetch_spacing: float = 3
+    min_update_interval: float = 0
+    auto_update: bool = False
 
 
 class SolcastApi:
@@ -64,33 +113,60 @@ class SolcastApi:
 
     def __init__(
         self,
-        aiohttp_session: ClientSession,
+        client: SolcastHttpClient,
         options: ConnectionOptions,
         apiCacheEnabled: bool = False
     ):
         """Device init."""
-        self.aiohttp_session = aiohttp_session
+        self._client = client
         self.options = options
         self.apiCacheEnabled = apiCacheEnabled
         self._sites = []
+        #rooftop site id to its (latitude, longitude), kept out of the site attributes
+        self._site_coords = {}
         self._data = {'siteinfo': {}, 'last_updated': None}
         self._api_used = None
         self._api_limit = None
+        #API key to its (daily_limit, daily_limit_consumed)
+        self._api_usage = {}
         self._filename = options.file_path
+        self._cache_filename = os.path.splitext(options.file_path)[0] + ".bin"
+        self._journal_filename = self._cache_filename + ".journal"
+        self._journal_changes = {}
         self._tz = options.tz
         self._dataenergy = {}
-        self._data_forecasts = []
+        #the energy dashboard hours and the site tallies of every estimate field
+        self._energy_by_field = {}
+        self._tallies = {}
+        self._data_forecasts = ForecastSeries()
+        self._day_index = {}
+        self._energy_index = {}
+        self._data_generation = 0
+        #first and last period merged since the last build, and what that build covered
+        self._dirty_range = None
+        self._built_for = None
+        self._forecast_day_cache = {}
         self._detailedForecasts = []
         self._loaded_data = False
         self._serialize_lock = asyncio.Lock()
+        self._last_poll_seconds = None
+        self._rate_limiters = {}
+        #rooftop site id to "ok" or why it failed, for the last poll
+        self._poll_outcomes = {}
         self._damp =options.dampening
         self._customhoursensor = options.customhoursensor
         self._use_data_field = f"pv_{options.key_estimate}"
         self._hardlimit = options.hard_limit
         #self._weather = ""
         
-    async def serialize_data(self):
-        """Serialize data to file."""
+    async def serialize_data(self, compact = False):
+        """Serialize data to file.
+
+        Only the periods changed since the last write are appended to the
+        journal. The full data is written to the solcast.bin snapshot when
+        compacting, when there is no snapshot yet or when the journal has grown
+        too large, and solcast.json is refreshed as an export at the same time.
+        """
         if not self._loaded_data:
             _LOGGER.debug(
                 f"SOLCAST - serialize_data not saving data as it has not been loaded yet"
@@ -99,8 +175,72 @@ class SolcastApi:
 
         async with self._serialize_lock:
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, lambda: open_file(self._filename, "w", 
-                lambda file: json.dump(self._data, file, ensure_ascii = False, cls = DateTimeEncoder)))
+            journal_size = os.path.getsize(self._journal_filename) if file_exists(self._journal_filename) else 0
+            if compact or not file_exists(self._cache_filename) or journal_size >= _JOURNAL_COMPACT_SIZE:
+                _LOGGER.debug(f"SOLCAST - serialize_data compacting {journal_size} bytes of journal into {self._cache_filename}")
+                self._journal_changes = {}
+                #site histories are only changed in place on the event loop, so the
+                #writer threads get a copy of the columns taken here
+                data = {
+                    **self._data,
+                    "siteinfo": {
+                        s: {**siteinfo, "forecasts": siteinfo["forecasts"].copy()}
+                        for s, siteinfo in self._data["siteinfo"].items()
+                    },
+                }
+                await loop.run_in_executor(None, lambda: replace_file(self._cache_filename, "wb",
+                    lambda file: write_frame(file, data)))
+                await loop.run_in_executor(None, lambda: open_file(self._journal_filename, "wb", lambda file: None))
+                await loop.run_in_executor(None, lambda: replace_file(self._filename, "w",
+                    lambda file: json.dump(data, file, ensure_ascii = False, cls = DateTimeEncoder)))
+                return
+
+            entry = {
+                "last_updated": self._data.get("last_updated"),
+                "siteinfo": {s: {"forecasts": rows} for s, rows in self._journal_changes.items()},
+            }
+            self._journal_changes = {}
+            await loop.run_in_executor(None, lambda: open_file(self._journal_filename, "ab", lambda file: write_frame(file, entry)))
+
+    async def compact_data(self, *args):
+        """Fold the journal into a new solcast.bin snapshot"""
+        if file_exists(self._journal_filename) and os.path.getsize(self._journal_filename) > 0:
+            await self.serialize_data(compact=True)
+
+    def read_saved_data(self) -> tuple[dict | None, bool]:
+        """Read the solcast.bin snapshot and its journal, or migrate a version 4 solcast.json.
+
+        Returns the data and whether the files on disk can be used as they are.
+        """
+        if file_exists(self._cache_filename):
+            frames, intact = read_frames(self._cache_filename)
+            if len(frames) > 0:
+                data = {**frames[0], "version": _JSON_VERSION}
+                if file_exists(self._journal_filename):
+                    journal, intact = read_frames(self._journal_filename)
+                    if not intact:
+                        _LOGGER.warning(f"SOLCAST - journal {self._journal_filename} has a corrupt entry, ignoring the rest of it")
+                    replay_journal(data, journal)
+                    _LOGGER.debug(f"SOLCAST - read_saved_data replayed {len(journal)} journal entries")
+                return data, intact
+
+            #fall back to the last solcast.json export
+            _LOGGER.error(f"SOLCAST - {self._cache_filename} is corrupt, removing it")
+            os.remove(self._cache_filename)
+            if file_exists(self._journal_filename):
+                os.remove(self._journal_filename)
+
+        if file_exists(self._filename):
+            data = open_file(self._filename, "r", lambda file: json.load(file, cls = JSONDecoder))
+            _LOGGER.debug(f"SOLCAST - read_saved_data migrating {self._filename}, file type is {type(data)}")
+            if data.get("version", 1) != _JSON_VERSION:
+                return None, False
+
+            for siteinfo in data['siteinfo'].values():
+                siteinfo['forecasts'] = ForecastSeries.from_rows(siteinfo['forecasts'])
+            return data, False
+
+        return None, True
 
     async def sites_data(self):
         """Request data via the Solcast API."""
@@ -120,8 +260,8 @@ class SolcastApi:
                             lambda file: json.load(file, cls = JSONDecoder)))
                         status = 200
                     else:
-                        resp: ClientResponse = await self.aiohttp_session.get(
-                            url=f"{self.options.host}/rooftop_sites", params=params, ssl=False
+                        resp: SolcastResponse = await self._client.get(
+                            f"{self.options.host}/rooftop_sites", params=params
                         )
 
                         resp_json = await resp.json(content_type=None)
@@ -138,8 +278,10 @@ class SolcastApi:
                     for i in d['sites']:
                         i['apikey'] = spl.strip()
                         #v4.0.14 to stop HA adding a pin to the map
-                        i.pop('longitude', None)
-                        i.pop('latitude', None)
+                        lon = i.pop('longitude', None)
+                        lat = i.pop('latitude', None)
+                        if lat is not None and lon is not None:
+                            self._site_coords[i['resource_id']] = (lat, lon)
 
                     self._sites = self._sites + d['sites']
                 else:
@@ -159,29 +301,34 @@ class SolcastApi:
             _LOGGER.error("SOLCAST - sites_data Exception error: %s", traceback.format_exc())
             
     async def sites_usage(self):
-        """Request api usage via the Solcast API."""
+        """Request api usage of every API key via the Solcast API."""
         
         try:
             sp = self.options.api_key.split(",")
+            self._api_usage = {}
 
-            params = {"api_key": sp[0]}
-    
-            async with async_timeout.timeout(60):
-                resp: ClientResponse = await self.aiohttp_session.get(
-                    url=f"https://api.solcast.com.au/json/reply/GetUserUsageAllowance", params=params, ssl=False
-                )
-                resp_json = await resp.json(content_type=None)
-                status = resp.status
+            for key in sp:
+                params = {"api_key": key}
+        
+                async with async_timeout.timeout(60):
+                    resp: SolcastResponse = await self._client.get(
+                        f"https://api.solcast.com.au/json/reply/GetUserUsageAllowance", params=params
+                    )
+                    resp_json = await resp.json(content_type=None)
+                    status = resp.status
 
-            if status == 200:
-                d = cast(dict, resp_json)
-                _LOGGER.debug(f"SOLCAST - Status {status} - sites_usage returned data: {d}")
-                self._api_limit = d.get("daily_limit", None)
-                self._api_used = d.get("daily_limit_consumed", None)
-            else:
-                self._api_limit = None
-                self._api_used = None
-                _LOGGER.debug(f"SOLCAST - Status {status} - sites_usage: gathering site data failed. Responce: {resp_json}.")
+                if status == 200:
+                    d = cast(dict, resp_json)
+                    _LOGGER.debug(f"SOLCAST - Status {status} - sites_usage returned data: {d}")
+                    self._api_usage[key] = (d.get("daily_limit", None), d.get("daily_limit_consumed", None))
+                else:
+                    self._api_usage[key] = (None, None)
+                    _LOGGER.debug(f"SOLCAST - Status {status} - sites_usage: gathering site data failed. Responce: {resp_json}.")
+
+            #the usage sensors show the total of every key
+            usage = list(self._api_usage.values())
+            self._api_limit = None if any(u[0] is None for u in usage) else sum(u[0] for u in usage)
+            self._api_used = None if any(u[1] is None for u in usage) else sum(u[1] for u in usage)
             
         except json.decoder.JSONDecodeError:
             _LOGGER.error("SOLCAST - sites_usage JSONDecodeError.. The data returned from Solcast is unknown, Solcast site could be having problems")
@@ -233,42 +380,44 @@ class SolcastApi:
     async def load_saved_data(self):
         try:
             if len(self._sites) > 0:
-                if file_exists(self._filename):
-                    loop = asyncio.get_running_loop()
-                    jsonData = await loop.run_in_executor(None, lambda: open_file(self._filename, "r",
-                        lambda file: json.load(file, cls = JSONDecoder)))
-                    json_version = jsonData.get("version", 1)
-                    #self._weather = jsonData.get("weather", "unknown")
-                    _LOGGER.debug(f"SOLCAST - load_saved_data file exists.. file type is {type(jsonData)}")
-                    if json_version == _JSON_VERSION:
-                        self._loaded_data = True
-                        self._data = jsonData
-
-                        #any new API keys so no sites data yet for those
-                        ks = {}
-                        for d in self._sites:
-                            if not any(s == d.get('resource_id', '') for s in jsonData['siteinfo']):
-                                ks[d.get('resource_id')] = d.get('apikey')
-
-                        if len(ks.keys()) > 0:
-                            #some api keys rooftop data does not exist yet so go and get it
-                            _LOGGER.debug("SOLCAST - Must be new API jey added so go and get the data for it")
-                            for a in ks:
-                                await self.http_data_call(r_id=a, api=ks[a], dopast=True)
-                            await self.serialize_data()
-
-                        #any site changes that need to be removed
-                        l = []
-                        for s in jsonData['siteinfo']:
-                            if not any(d.get('resource_id', '') == s for d in self._sites):
-                                _LOGGER.info(f"Solcast rooftop resource id {s} no longer part of your system.. removing saved data from cached file")
-                                l.append(s)
-
-                        for ll in l:
-                            del jsonData['siteinfo'][ll]
-
-                        #create an up to date forecast and make sure the TZ fits just in case its changed                
-                        await self.buildforcastdata()
+                loop = asyncio.get_running_loop()
+                jsonData, intact = await loop.run_in_executor(None, self.read_saved_data)
+                if jsonData is not None:
+                    self._loaded_data = True
+                    self._data = jsonData
+
+                    if not intact:
+                        #solcast.json was migrated, or new journal entries can't be appended after a torn one
+                        await self.serialize_data(compact=True)
+
+                    #any new API keys so no sites data yet for those
+                    ks = {}
+                    for d in self._sites:
+                        if not any(s == d.get('resource_id', '') for s in jsonData['siteinfo']):
+                            ks[d.get('resource_id')] = d.get('apikey')
+
+                    if len(ks.keys()) > 0:
+                        #some api keys rooftop data does not exist yet so go and get it
+                        _LOGGER.debug("SOLCAST - Must be new API jey added so go and get the data for it")
+                        for a in ks:
+                            await self.http_data_call(r_id=a, api=ks[a], dopast=True)
+                        await self.serialize_data()
+
+                    #any site changes that need to be removed
+                    l = []
+                    for s in jsonData['siteinfo']:
+                        if not any(d.get('resource_id', '') == s for d in self._sites):
+                            _LOGGER.info(f"Solcast rooftop resource id {s} no longer part of your system.. removing saved data from cached file")
+                            l.append(s)
+
+                    for ll in l:
+                        del jsonData['siteinfo'][ll]
+
+                    if len(l) > 0:
+                        await self.serialize_data(compact=True)
+
+                    #create an up to date forecast and make sure the TZ fits just in case its changed                
+                    await self.buildforcastdata()
                                     
                 if not self._loaded_data:
                     #no file to load
@@ -285,8 +434,10 @@ class SolcastApi:
     async def delete_solcast_file(self, *args):
         _LOGGER.debug(f"SOLCAST - service event to delete old solcast.json file")
         try:
-            if file_exists(self._filename):
-                os.remove(self._filename)
+            if file_exists(self._filename) or file_exists(self._cache_filename):
+                for filename in (self._filename, self._cache_filename, self._journal_filename):
+                    if file_exists(filename):
+                        os.remove(filename)
                 await self.sites_data()
                 await self.load_saved_data()
         except Exception:
@@ -295,20 +446,50 @@ class SolcastApi:
     async def get_forecast_list(self, *args):
         try:
             tz = self._tz
-            
+            period = self._data_forecasts.period
+            start = bisect_left(period, args[0].timestamp())
+            end = bisect_left(period, args[1].timestamp(), start)
+
             return tuple(
                 {
                     **d,
                     "period_start": d["period_start"].astimezone(tz),
                 }
-                for d in self._data_forecasts
-                if d["period_start"] >= args[0] and d["period_start"] < args[1]
+                for d in self._data_forecasts.rows(start, end)
             )
 
         except Exception:
             _LOGGER.error(f"SOLCAST - service event to get list of forecasts failed")
             return None
 
+    def get_data_export(self) -> dict[str, Any]:
+        """Return the cached data with site forecasts as plain rows"""
+        return {
+            **self._data,
+            "siteinfo": {
+                s: {**siteinfo, "forecasts": siteinfo["forecasts"].to_rows()}
+                for s, siteinfo in self._data["siteinfo"].items()
+            },
+        }
+
+    def get_daylight_window(self, when: dt) -> tuple[dt, dt] | None:
+        """Return the daylight window of the rooftop sites that contains when, or else the next one"""
+        try:
+            now = int(when.timestamp())
+            sites = [s['forecasts'] for s in self._data['siteinfo'].values() if 'forecasts' in s]
+            window = forecast_daylight(sites, now)
+            if window is None:
+                window = sun_daylight(self._site_coords.values(), now)
+            if window is None:
+                return None
+            return dt.fromtimestamp(window[0], timezone.utc), dt.fromtimestamp(window[1], timezone.utc)
+        except Exception:
+            return None
+
+    async def close(self):
+        """Close the connections of the HTTP client"""
+        await self._client.close()
+
     def get_api_used_count(self):
         """Return API polling count for this UTC 24hr period"""
         return self._api_used
@@ -361,18 +542,28 @@ class SolcastApi:
         
     def get_forecast_day(self, futureday) -> Dict[str, Any]:
         """Return Solcast Forecasts data for N days ahead"""
+        today = dt.now(self._tz).date()
+        da = today + timedelta(days=futureday)
+
+        #the attributes of a day only change with the data or the local date
+        key = (self._data_generation, da)
+        ret = self._forecast_day_cache.get(key)
+        if ret is None:
+            self._forecast_day_cache = {
+                k: v for k, v in self._forecast_day_cache.items() if k[0] == self._data_generation and k[1] >= today
+            }
+            ret = self._forecast_day_cache[key] = self.build_forecast_day(da)
+        return ret
+
+    def build_forecast_day(self, da) -> Dict[str, Any]:
+        """Build the Solcast Forecasts data of a local date"""
         noDataError = True
 
         tz = self._tz
-        da = dt.now(tz).date() + timedelta(days=futureday)
-        h = tuple(
-            d
-            for d in self._data_forecasts
-            if d["period_start"].astimezone(tz).date() == da
-        )
+        start, end = self._day_index.get(da, (0, 0))
         
         tup = tuple(
-                {**d, "period_start": d["period_start"].astimezone(tz)} for d in h
+                {**d, "period_start": d["period_start"].astimezone(tz)} for d in self._data_forecasts.rows(start, end)
             )
 
         if len(tup) < 48:
@@ -410,12 +601,9 @@ class SolcastApi:
             da = dt.now(timezone.utc).replace(
                 minute=0, second=0, microsecond=0
             ) + timedelta(hours=hourincrement)
-            g = tuple(
-                d
-                for d in self._data_forecasts
-                if d["period_start"] >= da and d["period_start"] < da + timedelta(hours=1)
-            )
-            m = sum(z[self._use_data_field] for z in g) / len(g)
+            start = bisect_left(self._data_forecasts.period, int(da.timestamp()))
+            end = bisect_left(self._data_forecasts.period, int(da.timestamp()) + 3600, start)
+            m = self.sum_forecasts(start, end) / (end - start)
 
             return int(m * 1000)
         except Exception as ex:
@@ -430,12 +618,10 @@ class SolcastApi:
             da = dt.now(timezone.utc).replace(
                 minute=0, second=0, microsecond=0
             ) + timedelta(hours=hourincrement)
-            g=[]
-            for d in self._data_forecasts:
-                if d["period_start"] >= danow and d["period_start"] < da:
-                    g.append(d)
+            start = bisect_left(self._data_forecasts.period, int(danow.timestamp()))
+            end = bisect_left(self._data_forecasts.period, int(da.timestamp()), start)
             
-            m = sum(z[self._use_data_field] for z in g)
+            m = self.sum_forecasts(start, end)
 
             return int(m * 500)
         except Exception as ex:
@@ -444,11 +630,13 @@ class SolcastApi:
     def get_power_production_n_mins(self, minuteincrement) -> float:
         """Return Solcast Power Now data for N minutes ahead"""
         try:
-            da = dt.now(timezone.utc) + timedelta(minutes=minuteincrement)
-            m = min(
-                (z for z in self._data_forecasts), key=lambda x: abs(x["period_start"] - da)
-            )
-            return int(m[self._use_data_field] * 1000)
+            da = (dt.now(timezone.utc) + timedelta(minutes=minuteincrement)).timestamp()
+            period = self._data_forecasts.period
+            #the nearest period is either side of the insertion point, the earlier one wins a tie
+            i = bisect_left(period, da)
+            if i == len(period) or (i > 0 and da - period[i - 1] <= period[i] - da):
+                i -= 1
+            return int(self._data_forecasts.column(self._use_data_field)[i] * 1000)
         except Exception as ex:
             return None
 
@@ -457,12 +645,8 @@ class SolcastApi:
         try:
             tz = self._tz
             da = dt.now(tz).date() + timedelta(days=dayincrement)
-            g = tuple(
-                d
-                for d in self._data_forecasts
-                if d["period_start"].astimezone(tz).date() == da
-            )
-            m = max(z[self._use_data_field] for z in g)
+            start, end = self._day_index.get(da, (0, 0))
+            m = max(self._data_forecasts.column(self._use_data_field)[start:end])
             return int(m * 1000)
         except Exception as ex:
             return None
@@ -472,13 +656,10 @@ class SolcastApi:
         try:
             tz = self._tz
             da = dt.now(tz).date() + timedelta(days=dayincrement)
-            g = tuple(
-                d
-                for d in self._data_forecasts
-                if d["period_start"].astimezone(tz).date() == da
-            )
+            start, end = self._day_index.get(da, (0, 0))
+            col = self._data_forecasts.column(self._use_data_field)
             #HA strips any TZ info set and forces UTC tz, so dont need to return with local tz info
-            return max((z for z in g), key=lambda x: x[self._use_data_field])["period_start"]
+            return self._data_forecasts.period_start(max(range(start, end), key=col.__getitem__))
         except Exception as ex:
             return None
 
@@ -493,13 +674,10 @@ class SolcastApi:
             else:
                 da = da.replace(minute=30)
             
-            g = tuple(
-                d
-                for d in self._data_forecasts
-                if d["period_start"].astimezone(tz).date() == da.date() and d["period_start"].astimezone(tz) >= da
-            )
+            start, end = self._day_index.get(da.date(), (0, 0))
+            start = bisect_left(self._data_forecasts.period, int(da.timestamp()), start, end)
 
-            return sum(z[self._use_data_field] for z in g) / 2
+            return self.sum_forecasts(start, end) / 2
         except Exception as ex:
             return None
 
@@ -511,24 +689,41 @@ class SolcastApi:
             d = d.replace(hour=0, minute=0, second=0, microsecond=0)
             needed_delta = d.replace(hour=23, minute=59, second=59, microsecond=0) - d
             
-            ret = 0.0
-            for idx in range(1, len(self._data_forecasts)):
-                prev = self._data_forecasts[idx - 1]
-                curr = self._data_forecasts[idx]
+            start, end = self._day_index.get(d.date(), (0, 0))
+            period = self._data_forecasts.period
+            col = self._data_forecasts.column(self._use_data_field)
 
-                prev_date = prev["period_start"].astimezone(tz).date()
-                cur_date = curr["period_start"].astimezone(tz).date()
-                if prev_date != cur_date or cur_date != d.date():
-                    continue
+            if end - start > 1 and period[end - 1] - period[start] == (end - start - 1) * 1800:
+                #every half hour of the day is there, so the trapezoids add up to the
+                #sum of the day less half of its first and last value, over 2 per hour
+                return (2 * self.sum_forecasts(start, end) - col[start] - col[end - 1]) / 4
 
-                delta: timedelta = curr["period_start"] - prev["period_start"]
+            ret = 0.0
+            for idx in range(start + 1, end):
+                delta = timedelta(seconds=period[idx] - period[idx - 1])
                 diff_hours = delta.total_seconds() / 3600
-                ret += (prev[self._use_data_field] + curr[self._use_data_field]) / 2 * diff_hours
+                ret += (col[idx - 1] + col[idx]) / 2 * diff_hours
                 needed_delta -= delta
             return ret
         except Exception as ex:
             return None
     
+    def sum_forecasts(self, start, end, field = None) -> float:
+        """Return the sum of a field over the combined forecast rows [start, end)"""
+        c = self._energy_index[field or self._use_data_field]
+        return c[end] - c[start]
+
+    def get_forecast_energy(self, start: dt, end: dt) -> dict[str, float] | None:
+        """Return the forecast kWh of each field for the periods starting between start and end"""
+        try:
+            period = self._data_forecasts.period
+            i = bisect_left(period, start.timestamp())
+            j = bisect_left(period, end.timestamp(), i)
+            return {f: round(self.sum_forecasts(i, j, f) / 2, 4) for f in FIELDS}
+        except Exception:
+            _LOGGER.error(f"SOLCAST - service event to get forecast energy failed")
+            return None
+
     def get_energy_data(self) -> dict[str, Any]:
         try:
             return self._dataenergy
@@ -538,20 +733,22 @@ class SolcastApi:
 
     async def http_data(self, dopast = False):
         """Request forecast data via the Solcast API."""
-        lastday = dt.now(self._tz) + timedelta(days=7)
-        lastday = lastday.replace(hour=23,minute=59).astimezone(timezone.utc)
+        started = time.monotonic()
 
+        #the sites of each API key are polled separately, the keys in parallel
+        sites = {}
         for site in self._sites:
-            _LOGGER.debug(f"SOLCAST - API polling for rooftop {site['resource_id']}")
-            #site=site['resource_id'], apikey=site['apikey'],
-            ok = await self.http_data_call(site['resource_id'], site['apikey'], dopast)
-            if ok is None:
-                return
-            
-            if len(self._sites) > 1:
-                #try to stop Solcast from rate limiting calling too fast
-                #little 3 sec sleep before calling API again
-                await asyncio.sleep(3)
+            sites.setdefault(site['apikey'], []).append(site)
+        self._poll_outcomes = {}
+        await asyncio.gather(*(self.http_data_key(s, dopast) for s in sites.values()))
+
+        self._last_poll_seconds = round(time.monotonic() - started, 3)
+        _LOGGER.info(f"SOLCAST - Polled {len(self._sites)} rooftop sites with {len(sites)} API keys in {self._last_poll_seconds}s")
+        failed = {s: o for s, o in self._poll_outcomes.items() if o != "ok"}
+        if failed:
+            _LOGGER.warning(f"SOLCAST - {len(failed)} of {len(self._poll_outcomes)} rooftop sites failed to update: {failed}")
+        if failed and len(failed) == len(self._poll_outcomes):
+            return
 
         self._data["last_updated"] = dt.now(timezone.utc).isoformat()
         #await self.sites_usage()
@@ -559,132 +756,158 @@ class SolcastApi:
         #self._data["weather"] = self._weather
         self._loaded_data = True
         
-        await self.buildforcastdata()
+        await self.buildforcastdata(dirty_only=True)
         await self.serialize_data()
 
+    async def http_data_key(self, sites, dopast = False):
+        """Poll the rooftop sites of one API key.
+
+        At most fetch_concurrency sites are polled at once and their requests
+        start at least fetch_spacing seconds apart, to stop Solcast from rate
+        limiting calls made too fast. A failed site does not stop the others,
+        the outcome of every site is kept in _poll_outcomes.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, int(self.options.fetch_concurrency)))
+        spacing = asyncio.Lock()
+        next_start = loop.time()
+
+        async def poll(site):
+            nonlocal next_start
+            r_id = site['resource_id']
+            async with semaphore:
+                async with spacing:
+                    await asyncio.sleep(max(0, next_start - loop.time()))
+                    next_start = loop.time() + self.options.fetch_spacing
+
+                _LOGGER.debug(f"SOLCAST - API polling for rooftop {r_id}")
+                try:
+                    if await self.http_data_call(r_id, site['apikey'], dopast):
+                        self._poll_outcomes[r_id] = "ok"
+                    else:
+                        self._poll_outcomes.setdefault(r_id, "no data")
+                except Exception as e:
+                    _LOGGER.error(f"SOLCAST - Polling rooftop {r_id} failed: {e}")
+                    self._poll_outcomes[r_id] = f"error: {e}"
+
+        await asyncio.gather(*(poll(site) for site in sites))
+
+    def rate_limiter(self, apikey) -> TokenBucket:
+        """Return the request rate limiter shared by the sites of an API key"""
+        if apikey not in self._rate_limiters:
+            self._rate_limiters[apikey] = TokenBucket(_API_RATE, _API_BURST)
+        return self._rate_limiters[apikey]
+
     async def http_data_call(self, r_id = None, api = None, dopast = False):
         """Request forecast data via the Solcast API."""
         lastday = dt.now(self._tz) + timedelta(days=7)
         lastday = lastday.replace(hour=23,minute=59).astimezone(timezone.utc)
-        pastdays = dt.now(self._tz).date() + timedelta(days=-730)
+        #rows from the first half hour of the oldest day are kept as they end on that day
+        pastdays = dt.now(self._tz).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=-730, minutes=30)
         _LOGGER.debug(f"SOLCAST - Polling API for rooftop_id {r_id}")
 
-        _data = []
-        _data2 = []
+        _data = ForecastSeries()
+
+        #the rows are merged in as they arrive, the response is never held whole
+        def add_rows(**kwargs):
+            return lambda rows: _data.merge(ForecastSeries.from_response(rows, **kwargs))
         
         #this is one run once, for a new install or if the solcasft.json file is deleted
         #this does use up an api call count too
         if dopast:
-            ae = None
-            resp_dict = await self.fetch_data("estimated_actuals", 168, site=r_id, apikey=api, cachedname="actuals")
-            if resp_dict is None:
+            oldest = dt.now(self._tz).replace(hour=0,minute=0,second=0,microsecond=0) - timedelta(days=6)
+            count = await self.fetch_data("estimated_actuals", 168, site=r_id, apikey=api, cachedname="actuals",
+                on_rows=add_rows(fields=("pv_estimate",), after=int(oldest.timestamp())))
+            if count is None:
                 return None
-            
-            if not isinstance(resp_dict, dict):
-                _LOGGER.warning("SOLCAST - No data was returned so this WILL cause errors.. either your limit is up, internet down.. what ever the case is it is NOT a problem with the integration, and all other problems of sensor values being wrong will be a seen")
-                _LOGGER.debug(f"Solcast - Status {resp_dict.status} - API did not return a json object. Returned {resp_dict}")
-                return None
-            
-            ae = resp_dict.get("estimated_actuals", None)
-            
-            if not isinstance(ae, list):
-                raise TypeError(f"estimated actuals must be a list, not {type(ae)}")
-            else:
-                oldest = dt.now(self._tz).replace(hour=0,minute=0,second=0,microsecond=0) - timedelta(days=6)
-                oldest = oldest.astimezone(timezone.utc)
-
-                for x in ae:
-                    z = parse_datetime(x["period_end"]).astimezone(timezone.utc)
-                    z = z.replace(second=0, microsecond=0) - timedelta(minutes=30)
-                    if z.minute not in {0, 30}:
-                        raise ValueError(
-                            f"Solcast period_start minute is not 0 or 30. {z.minute}"
-                        )
-                    if z > oldest:
-                        _data2.append(
-                            {
-                                "period_start": z,
-                                "pv_estimate": x["pv_estimate"],
-                                "pv_estimate10": 0,
-                                "pv_estimate90": 0,
-                            }
-                        )
 
-        resp_dict = await self.fetch_data("forecasts", 168, site=r_id, apikey=api, cachedname="forecasts")
-        if resp_dict is None:
+        #forecasts win over estimated actuals for the same period
+        count = await self.fetch_data("forecasts", 168, site=r_id, apikey=api, cachedname="forecasts",
+            on_rows=add_rows(before=int(lastday.timestamp())))
+        if count is None:
             return None
-        if not isinstance(resp_dict, dict):
-            raise TypeError(f"Solcast - API fectching data did not return a json object. Returned {resp_dict}")
-        
-        af = resp_dict.get("forecasts", None)
-        if not isinstance(af, list):
-            raise TypeError(f"forecasts must be a list, not {type(af)}")
         else:
-            _LOGGER.debug(f"SOLCAST - Solcast returned {len(af)} records (should be 168)")
-
-            for x in af:
-                z = parse_datetime(x["period_end"]).astimezone(timezone.utc)
-                z = z.replace(second=0, microsecond=0) - timedelta(minutes=30)
-                if z.minute not in {0, 30}:
-                    raise ValueError(
-                        f"Solcast period_start minute is not 0 or 30. {z.minute}"
-                    )
-                if z < lastday:
-                    _data2.append(
-                        {
-                            "period_start": z,
-                            "pv_estimate": x["pv_estimate"],
-                            "pv_estimate10": x["pv_estimate10"],
-                            "pv_estimate90": x["pv_estimate90"],
-                        }
-                    )
-
-            _data = sorted(_data2, key=itemgetter("period_start"))
-            _forecasts = []
+            _LOGGER.debug(f"SOLCAST - Solcast returned {count} records (should be 168)")
 
-            try:
-                _forecasts = self._data['siteinfo'][r_id]['forecasts']
-            except Exception:
-                pass
+            #the site history is owned by self._data and updated in place, not copied
+            _forecasts = self._data['siteinfo'].setdefault(r_id, {}).setdefault('forecasts', ForecastSeries())
         
-            for x in _data:
-                #loop each rooftop site and its forecasts
-                
-                itm = next((item for item in _forecasts if item["period_start"] == x["period_start"]), None)
-                if itm:
-                    itm["pv_estimate"] = x["pv_estimate"]
-                    itm["pv_estimate10"] = x["pv_estimate10"]
-                    itm["pv_estimate90"] = x["pv_estimate90"]
-                else:    
-                    # _LOGGER.debug("adding itm")
-                    _forecasts.append({"period_start": x["period_start"],"pv_estimate": x["pv_estimate"],
-                                                            "pv_estimate10": x["pv_estimate10"],
-                                                            "pv_estimate90": x["pv_estimate90"]})
+            #merge the fetched rows into the rooftop site history
+            merged = _forecasts.merge(_data)
+            if merged is not None:
+                if self._dirty_range is None:
+                    self._dirty_range = merged
+                else:
+                    self._dirty_range = (min(self._dirty_range[0], merged[0]), max(self._dirty_range[1], merged[1]))
             
             #_forecasts now contains all data for the rooftop site up to 730 days worth
             #this deletes data that is older than 730 days (2 years)   
-            for x in _forecasts:
-                zz = x['period_start'].astimezone(self._tz) - timedelta(minutes=30)
-                if zz.date() < pastdays:
-                    _forecasts.remove(x)
-        
-            _forecasts = sorted(_forecasts, key=itemgetter("period_start"))
+            dropped = _forecasts.prune(int(pastdays.timestamp()))
+            if dropped > 0:
+                _LOGGER.debug(f"SOLCAST - Removed {dropped} records older than {pastdays} for rooftop {r_id}")
             
-            self._data['siteinfo'].update({r_id:{'forecasts': copy.deepcopy(_forecasts)}})
+            self._journal_changes.setdefault(r_id, ForecastSeries()).merge(_data)
     
         return True
 
-    async def fetch_data(self, path= "", hours=168, site="", apikey="", cachedname="forcasts") -> dict[str, Any]:
-        """fetch data via the Solcast API."""
+    async def fetch_data(self, path= "", hours=168, site="", apikey="", cachedname="forcasts", on_rows=None) -> int | None:
+        """fetch data via the Solcast API.
+
+        The rows of the path list in the response are passed to on_rows a
+        chunk at a time as they arrive, and the number of rows is returned.
+        A retry after a response broke off passes its rows again.
+
+        Throttled, failed and timed out requests are retried with exponential
+        backoff and jitter until _FETCH_DEADLINE seconds after the first try.
+        A 429 with Retry-After holds every request of the API key that long,
+        unless that runs past the deadline and the site is given up on as
+        rate limited.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _FETCH_DEADLINE
+        limiter = self.rate_limiter(apikey)
+        attempt = 0
+        while True:
+            status, d, retry_after = await self.fetch_data_once(limiter, deadline, path, hours, site, apikey, cachedname, on_rows)
+            if status == 200:
+                return d
+
+            reason = f"status {status}" if isinstance(status, int) else status
+            self._poll_outcomes[site] = reason
+            if status not in _FETCH_RETRY:
+                return None
+
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, _BACKOFF_BASE, _BACKOFF_CAP)
+            if loop.time() + delay > deadline:
+                if status == 429:
+                    self._poll_outcomes[site] = "rate limited"
+                _LOGGER.warning(f"SOLCAST - Giving up on {path} for rooftop {site} after {attempt + 1} attempts, last {reason}")
+                return None
+            if status == 429 and retry_after is not None:
+                limiter.pause(retry_after)
+
+            attempt += 1
+            _LOGGER.info(f"SOLCAST - Retrying {path} for rooftop {site} in {delay:.1f}s after {reason} (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+    async def fetch_data_once(self, limiter, deadline, path, hours, site, apikey, cachedname, on_rows) -> tuple[int | str, int | None, float | None]:
+        """Make one request, returning the status, the number of rows and the Retry-After seconds"""
         
+        retry_after = None
         try:
             params = {"format": "json", "api_key": apikey, "hours": hours}
             url=f"{self.options.host}/rooftop_sites/{site}/{path}"
             _LOGGER.debug(f"SOLCAST - fetch_data code url - {url}")
 
+            apiCacheFileName = cachedname + "_" + site + ".json"
+            cached = self.apiCacheEnabled and file_exists(apiCacheFileName)
+            #the wait for the rate limiter is not part of the request timeout
+            if not cached and not await limiter.acquire(deadline):
+                _LOGGER.warning(f"SOLCAST - API key is rate limited past the deadline, giving up on {path} for rooftop {site}")
+                return "rate limited", None, None
+
             async with async_timeout.timeout(120):
-                apiCacheFileName = cachedname + "_" + site + ".json"
-                if self.apiCacheEnabled and file_exists(apiCacheFileName):
+                if cached:
                     _LOGGER.debug(f"SOLCAST - Getting cached testing data for site {site}")
                     status = 404
                     loop = asyncio.get_running_loop()
@@ -692,143 +915,227 @@ class SolcastApi:
                         lambda file: json.load(file, cls = JSONDecoder)))
                     status = 200
                     _LOGGER.debug(f"SOLCAST - Got cached file data for site {site}")
+                    rows = response_rows(resp_json, path)
+                    on_rows(rows)
+                    return status, len(rows), None
                 else:
                     #_LOGGER.debug(f"SOLCAST - OK REAL API CALL HAPPENING RIGHT NOW")
-                    resp: ClientResponse = await self.aiohttp_session.get(
-                        url=url, params=params, ssl=False
-                    )
-                    resp_json = await resp.json(content_type=None)
-                    status = resp.status
-
-                    if status == 200:
-                        #_LOGGER.debug(f"SOLCAST - Status 200 OK - API returned data. API Counter incremented from {self._api_used} to {self._api_used + 1}")
-                        #self._api_used = self._api_used + 1
-
-                        _LOGGER.debug("SOLCAST - Status 200 OK - API returned data.")
-
-                        if self.apiCacheEnabled:
-                            loop = asyncio.get_running_loop()
-                            # Should it be with: cls = DateTimeEncoder ???
-                            await loop.run_in_executor(None, lambda: open_file(apiCacheFileName, "w", 
-                                lambda file: json.dump(resp_json, file, ensure_ascii = False)))
-
-                        d = cast(dict, resp_json)
-                        _LOGGER.debug(f"SOLCAST - fetch_data Returned: {d}")
-                        return d
-
-                    elif status == 202:
-                        _LOGGER.info(f"SOLCAST - Status 202 Accepted - The request was accepted but does not include any data in the response. {resp_json}")
+                    async with self._client.stream(url, params=params) as resp:
+                        status = resp.status
+                        if status == 200:
+                            return status, await self.read_rows(resp, path, apiCacheFileName, on_rows), None
+                        if status in (429, 503):
+                            retry_after = retry_after_seconds(resp.headers)
+                        #error pages of gateways and load balancers are not JSON, the body is only logged
+                        resp_text = await resp.text()
+
+                    if status == 202:
+                        _LOGGER.info(f"SOLCAST - Status 202 Accepted - The request was accepted but does not include any data in the response. {resp_text}")
                     elif status == 400:
-                        _LOGGER.info(f"SOLCAST - Status 400 Bad Request - The request may have included invalid parameters. {resp_json}")
+                        _LOGGER.info(f"SOLCAST - Status 400 Bad Request - The request may have included invalid parameters. {resp_text}")
                         #raise Exception(f"HTTP error: The rooftop site missing capacity, please specify capacity or provide historic data for tuning.")
                     elif status == 401:
-                        _LOGGER.info(f"SOLCAST - Status 401 Unauthorized - The request did not correctly include a valid API Key. {resp_json}")
+                        _LOGGER.info(f"SOLCAST - Status 401 Unauthorized - The request did not correctly include a valid API Key. {resp_text}")
                     elif status == 403:
                         _LOGGER.info(f"SOLCAST - Status 403 Forbidden - The request includes parameter(s) not available ")
                     elif status == 404:
                         _LOGGER.info("SOLCAST - Status 404. The rooftop site cannot be found or is not accessible.")
                         #raise Exception(f"HTTP error: The rooftop site cannot be found or is not accessible.")
                     elif status == 429:
-                        _LOGGER.info(f"SOLCAST - Status 429 Too Many Requests - The request exceeds the available rate limit. {resp_json}")
+                        _LOGGER.info(f"SOLCAST - Status 429 Too Many Requests - The request exceeds the available rate limit. {resp_text}")
                     elif status == 500:
-                        _LOGGER.info(f"SOLCAST - Status 500 Internal Server Error - An internal error has prevented the request from processing.. {resp_json}")
+                        _LOGGER.info(f"SOLCAST - Status 500 Internal Server Error - An internal error has prevented the request from processing.. {resp_text}")
                     else:
-                        _LOGGER.info(f"SOLCAST - Status {status} - {resp_json}")
+                        _LOGGER.info(f"SOLCAST - Status {status} - {resp_text}")
+                    return status, None, retry_after
         except ConnectionRefusedError as err:
             _LOGGER.error("SOLCAST - Error. Connection Refused. %s",err)
+            return "connection error", None, None
         except ClientConnectionError as e:
-            _LOGGER.error('SOLCAST - Connection Error', str(e))
+            _LOGGER.error('SOLCAST - Connection Error %s', str(e))
+            return "connection error", None, None
         except asyncio.TimeoutError:
             _LOGGER.error("SOLCAST - Connection Timeout Error - Timed out connectng to Solcast API server")
+            return "timeout", None, None
         except Exception as e:
             _LOGGER.error("SOLCAST - API Data Fetch Error: %s", traceback.format_exc())
 
-        return None
-    
-    def makeenergydict(self) -> dict:
-        wh_hours = {}
+        return "error", None, None
+
+    async def read_rows(self, resp, path, apiCacheFileName, on_rows) -> int:
+        """Pass the rows of the path list in a 200 response to on_rows as they arrive"""
+        _LOGGER.debug("SOLCAST - Status 200 OK - API returned data.")
+
+        if self.apiCacheEnabled:
+            #the cached testing data is the whole response
+            resp_json = await resp.json(content_type=None)
+            loop = asyncio.get_running_loop()
+            # Should it be with: cls = DateTimeEncoder ???
+            await loop.run_in_executor(None, lambda: open_file(apiCacheFileName, "w", 
+                lambda file: json.dump(resp_json, file, ensure_ascii = False)))
+            rows = response_rows(resp_json, path)
+            on_rows(rows)
+            return len(rows)
+
+        items = ArrayItems(path)
+        async for chunk in resp.iter_chunked(_CHUNK_SIZE):
+            rows = items.feed(chunk)
+            if rows:
+                on_rows(rows)
+        items.close()
+        return items.count
     
-        try:
-            lastv = -1
-            lastk = -1
-            for v in self._data_forecasts:
-                d = v['period_start'].isoformat()
-                if v[self._use_data_field] == 0.0:
-                    if lastv > 0.0:
-                        wh_hours[d] = round(v[self._use_data_field] * 500,0)
-                        wh_hours[lastk] = 0.0
-                    lastk = d
-                    lastv = v[self._use_data_field]
-                else:
-                    if lastv == 0.0:
-                        #add the last one
-                        wh_hours[lastk] = round(lastv * 500,0)
+    def makeenergydicts(self, previous = None, start = 0) -> Dict[str, dict]:
+        """Build the energy dashboard hours of every estimate field.
 
-                    wh_hours[d] = round(v[self._use_data_field] * 500,0)
-                    
-                    lastk = d
-                    lastv = v[self._use_data_field]
-        except Exception as e:
-            _LOGGER.error("SOLCAST - makeenergydict: %s", traceback.format_exc())
+        With the dicts of an earlier build as previous, only the entries from
+        row start on are rebuilt, into copies as the energy platform may still
+        hold the previous ones.
+        """
+        ret = {}
+        #the entry of the row before start depends on the row at start
+        start = max(start - 1, 0) if previous is not None else 0
+        first = max(start - 1, 0)
+        keys = [self._data_forecasts.period_start(i).isoformat() for i in range(first, len(self._data_forecasts))]
+
+        for field in FIELDS:
+            wh_hours = dict(previous[field]) if previous is not None else {}
+            try:
+                col = self._data_forecasts.column(field)
+                lastv = -1
+                lastk = -1
+                for d in keys[start - first:]:
+                    wh_hours.pop(d, None)
+                if start > 0:
+                    lastv = col[start - 1]
+                    lastk = keys[0]
+
+                for i in range(start, len(col)):
+                    d = keys[i - first]
+                    if col[i] == 0.0:
+                        if lastv > 0.0:
+                            wh_hours[d] = round(col[i] * 500,0)
+                            wh_hours[lastk] = 0.0
+                        lastk = d
+                        lastv = col[i]
+                    else:
+                        if lastv == 0.0:
+                            #add the last one
+                            wh_hours[lastk] = round(lastv * 500,0)
 
-        return wh_hours
+                        wh_hours[d] = round(col[i] * 500,0)
+                        
+                        lastk = d
+                        lastv = col[i]
+            except Exception as e:
+                _LOGGER.error("SOLCAST - makeenergydicts: %s", traceback.format_exc())
+            ret[field] = wh_hours
+
+        return ret
+
+    def update_tallies(self, today):
+        """Tally the energy of every site today, for every estimate field"""
+        sites = {s: siteinfo['forecasts'] for s, siteinfo in self._data['siteinfo'].items()}
+        todays = (local_midnight(today, self._tz), local_midnight(today + timedelta(days=1), self._tz))
+        self._tallies = {f: tally_sites(sites, todays, self._tz, self._damp, self._hardlimit, f) for f in FIELDS}
+        for s, tally in self._tallies[self._use_data_field].items():
+            self._data['siteinfo'][s]['tally'] = tally
+
+    def set_estimate_field(self, key_estimate):
+        """Switch the estimate field used for the sensors, everything it needs is already built"""
+        self.options.key_estimate = key_estimate
+        self._use_data_field = f"pv_{key_estimate}"
+        for s, tally in self._tallies.get(self._use_data_field, {}).items():
+            self._data['siteinfo'][s]['tally'] = tally
+        self._dataenergy = {"wh_hours": self._energy_by_field.get(self._use_data_field, {})}
+        self._data_generation += 1
+
+    async def set_dampening(self, damp: Dict[str, float]):
+        """Apply new hourly dampening factors to the site forecasts already in memory"""
+        self._damp = damp
+        self.options.dampening = damp
+        await self.buildforcastdata()
+
+    async def set_hard_limit(self, hard_limit: float):
+        """Apply a new hard limit to the site forecasts already in memory"""
+        self._hardlimit = hard_limit
+        self.options.hard_limit = hard_limit
+        await self.buildforcastdata()
     
-    async def buildforcastdata(self):
+    async def buildforcastdata(self, dirty_only = False):
         """build the data needed and convert where needed"""
         try:
             today = dt.now(self._tz).date()
-            yesterday = dt.now(self._tz).date() + timedelta(days=-730)
-            lastday = dt.now(self._tz).date() + timedelta(days=7)
-            
-            _forecasts = {}
-
-            for s, siteinfo in self._data['siteinfo'].items():
-                tally = 0
-                for x in siteinfo['forecasts']:
-                    #loop each rooftop site and its forecasts
-                    z = x["period_start"]
-                    zz = z.astimezone(self._tz) #- timedelta(minutes=30)
-
-                    #v4.0.8 added code to dampen the forecast data.. (* self._damp[h])
-                    
-                    if yesterday < zz.date() < lastday:
-                        h = f"{zz.hour}"
-                        if zz.date() == today:
-                            tally += min(x[self._use_data_field] * 0.5 * self._damp[h], self._hardlimit)
-                        
-                        itm = _forecasts.get(z)
-                        if itm:
-                            itm["pv_estimate"] = min(round(itm["pv_estimate"] + (x["pv_estimate"] * self._damp[h]),4), self._hardlimit)
-                            itm["pv_estimate10"] = min(round(itm["pv_estimate10"] + (x["pv_estimate10"] * self._damp[h]),4), self._hardlimit)
-                            itm["pv_estimate90"] = min(round(itm["pv_estimate90"] + (x["pv_estimate90"] * self._damp[h]),4), self._hardlimit)
-                        else:    
-                            _forecasts[z] = {"period_start": z,"pv_estimate": min(round((x["pv_estimate"]* self._damp[h]),4), self._hardlimit),
-                                            "pv_estimate10": min(round((x["pv_estimate10"]* self._damp[h]),4), self._hardlimit),
-                                            "pv_estimate90": min(round((x["pv_estimate90"]* self._damp[h]),4), self._hardlimit)}
+            if dirty_only and self._built_for == (today, tuple(self._data['siteinfo'])):
+                await self.patchforcastdata(today)
+                return
 
-                siteinfo['tally'] = round(tally, 4)
+            self._dirty_range = None
+            self._built_for = (today, tuple(self._data['siteinfo']))
+
+            #v4.0.8 added code to dampen the forecast data.. (* self._damp[h])
+            #the 730 days up to today and the 7 days from today, in local dates
+            self._data_forecasts = aggregate_sites(
+                {s: siteinfo['forecasts'] for s, siteinfo in self._data['siteinfo'].items()},
+                local_midnight(today + timedelta(days=-729), self._tz),
+                local_midnight(today + timedelta(days=7), self._tz),
+                self._tz,
+                self._damp,
+                self._hardlimit,
+            )
 
-            self._data_forecasts = list(_forecasts.values())
-            self._data_forecasts.sort(key=itemgetter("period_start"))
+            self.update_tallies(today)
+            self._day_index = build_day_index(self._data_forecasts.period, self._tz)
+            self._energy_index = self._data_forecasts.cumulative()
+            self._data_generation += 1
 
             await self.checkDataRecords()
                     
-            self._dataenergy = {"wh_hours": self.makeenergydict()}
+            self._energy_by_field = self.makeenergydicts()
+            self._dataenergy = {"wh_hours": self._energy_by_field[self._use_data_field]}
                 
         except Exception as e:
             _LOGGER.error("SOLCAST - http_data error: %s", traceback.format_exc())
+
+    async def patchforcastdata(self, today):
+        """Rebuild only the combined periods merged since the last build.
+
+        Every combined period only depends on the site rows of that period, so
+        the periods in the dirty range are aggregated again and merged into the
+        combined series, then the indexes are patched from the first of them.
+        """
+        dirty, self._dirty_range = self._dirty_range, None
+
+        if dirty is not None:
+            piece = aggregate_sites(
+                {s: siteinfo['forecasts'] for s, siteinfo in self._data['siteinfo'].items()},
+                max(dirty[0], local_midnight(today + timedelta(days=-729), self._tz)),
+                min(dirty[1] + 1800, local_midnight(today + timedelta(days=7), self._tz)),
+                self._tz,
+                self._damp,
+                self._hardlimit,
+            )
+            if len(piece) > 0:
+                self._data_forecasts.merge(piece)
+                start = bisect_left(self._data_forecasts.period, piece.period[0])
+                self._day_index = build_day_index(self._data_forecasts.period, self._tz)
+                self._data_forecasts.cumulative(self._energy_index, start)
+                self._energy_by_field = self.makeenergydicts(self._energy_by_field, start)
+                self._dataenergy = {"wh_hours": self._energy_by_field[self._use_data_field]}
+                _LOGGER.debug(f"SOLCAST - Rebuilt {len(piece)} periods from {self._data_forecasts.period_start(start)}")
+
+        self.update_tallies(today)
+        self._data_generation += 1
+
+        await self.checkDataRecords()
         
     async def checkDataRecords(self):
         tz = self._tz
         for i in range(0,6):
             da = dt.now(tz).date() + timedelta(days=i)
-            h = tuple(
-                d
-                for d in self._data_forecasts
-                if d["period_start"].astimezone(tz).date() == da
-            )
+            start, end = self._day_index.get(da, (0, 0))
 
-            if len(h) == 48:
+            if end - start == 48:
                 _LOGGER.debug(f"SOLCAST - Data for {da} contains all 48 records")
             else:
-                _LOGGER.debug(f"SOLCAST - Data for {da} contains only {len(h)} of 48 records and may produce inaccurate forecast data")
\ No newline at end of file
+                _LOGGER.debug(f"SOLCAST - Data for {da} contains only {end - start} of 48 records and may produce inaccurate forecast data")
\ No newline at end of file